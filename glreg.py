@@ -114,19 +114,45 @@ typedef khronos_int8_t GLbyte;...
 """
 from __future__ import print_function
 import collections
+import contextlib
 import functools
 import argparse
+import hashlib
+import itertools
+import json
+import mmap
+import multiprocessing
+import operator
+import os
+import pickle
 import re
 import signal
+import string
 import sys
+import tempfile
+import threading
+import time
 import xml.etree.ElementTree
+import xml.parsers.expat
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:  # Python 2
+    from collections import Mapping, MutableMapping
+try:
+    from cStringIO import StringIO  # Python 2
+except ImportError:
+    from io import StringIO
 __author__ = 'Paul Tan <pyokagan@gmail.com>'
 __version__ = '0.9.0a3'
 __all__ = ['Type', 'Enum', 'Command', 'Param', 'Require', 'Remove', 'Feature',
-           'Extension', 'Registry', 'load', 'loads', 'import_type',
-           'import_command', 'import_enum', 'import_feature',
-           'import_extension', 'import_registry', 'extension_sort_key',
-           'group_apis']
+           'Extension', 'Registry', 'RegistryView', 'SymbolIndex',
+           'StringPool', 'RegistryFeeder', 'load', 'loads', 'load_path',
+           'load_cached', 'import_type', 'import_command', 'import_enum',
+           'import_feature', 'import_extension', 'import_registry',
+           'extension_sort_key', 'group_apis', 'iter_group_apis',
+           'write_header', 'write_loader', 'get_enum_table',
+           'write_enum_table', 'generate_headers', 'SectionDiff',
+           'RegistryDiff', 'diff', 'Tracer', 'set_tracer']
 
 
 def _repr(self, args, opt_args=()):
@@ -136,7 +162,216 @@ def _repr(self, args, opt_args=()):
                              ', '.join(repr(x) for x in args))
 
 
+# Wall and CPU clocks of Tracer phases
+_wall_clock = getattr(time, 'perf_counter', time.time)
+_cpu_clock = getattr(time, 'process_time', None) or time.clock
+
+
+class Tracer(object):
+    """Records the phases and counters of glreg functions
+
+    A Tracer installed with :py:func:`set_tracer` is notified of every phase
+    (parsing, loading of registry sections, importing of features and
+    extensions, grouping and header writing) and of every counted call
+    (``import_type``, ``import_command`` and ``filter_symbol``). Subclasses
+    may override :py:meth:`begin`, :py:meth:`end` and :py:meth:`count` to
+    receive these notifications.
+
+    Phases must be begun and ended by the same thread, in nested order.
+    """
+
+    def __init__(self):
+        #: list of finished phases as Chrome trace-event dicts
+        self.events = []
+        #: dict mapping counter names to counts
+        self.counters = collections.defaultdict(int)
+        self._stack = []
+        self._start = _wall_clock()
+
+    def begin(self, name, args=None):
+        """Begins phase `name`
+
+        :param str name: Phase name
+        :param dict args: Extra phase information
+        """
+        self._stack.append((name, args, _wall_clock(), _cpu_clock()))
+
+    def end(self, args=None):
+        """Ends the last begun phase
+
+        :param dict args: Extra phase information, added to the information
+                          given to :py:meth:`begin`
+        """
+        name, begin_args, wall, cpu = self._stack.pop()
+        end_wall, end_cpu = _wall_clock(), _cpu_clock()
+        event_args = dict(begin_args or ())
+        event_args.update(args or ())
+        event_args['cpu_us'] = (end_cpu - cpu) * 1e6
+        self.events.append({
+            'name': name, 'cat': 'glreg', 'ph': 'X',
+            'ts': (wall - self._start) * 1e6,
+            'dur': (end_wall - wall) * 1e6,
+            'pid': os.getpid(), 'tid': threading.current_thread().ident,
+            'args': event_args})
+
+    def count(self, name, n=1):
+        """Adds `n` to counter `name`"""
+        self.counters[name] += n
+
+    def get_phase_totals(self):
+        """Returns the number of occurrences, total wall time and total CPU
+        time in seconds of every phase
+
+        :return: dict mapping phase names to ``(count, wall, cpu)`` tuples
+        """
+        out = {}
+        for x in self.events:
+            n, wall, cpu = out.get(x['name'], (0, 0.0, 0.0))
+            out[x['name']] = (n + 1, wall + x['dur'] / 1e6,
+                              cpu + x['args']['cpu_us'] / 1e6)
+        return out
+
+    def get_chrome_trace(self):
+        """Returns the recorded phases and counters in Chrome trace-event
+        format
+
+        :return: dict, suitable for serializing as JSON
+        """
+        events = list(self.events)
+        ts = (_wall_clock() - self._start) * 1e6
+        for name in sorted(self.counters):
+            events.append({'name': name, 'cat': 'glreg', 'ph': 'C',
+                           'ts': ts, 'pid': os.getpid(),
+                           'args': {name: self.counters[name]}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, f):
+        """Writes the recorded phases and counters to a file in Chrome
+        trace-event format
+
+        :param f: File to write to
+        """
+        json.dump(self.get_chrome_trace(), f)
+
+
+# Tracer notified of glreg phases and calls, or None
+_tracer = None
+
+
+def set_tracer(tracer):
+    """Installs a Tracer
+
+    :param Tracer tracer: Tracer to notify of glreg phases and calls, or None
+                          to disable tracing.
+    :return: The previously installed Tracer, or None
+    """
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+
+@contextlib.contextmanager
+def _phase(name, args=None):
+    """Traces the enclosed block as phase `name`
+
+    Yields a dict to which information only known at the end of the phase
+    can be added.
+    """
+    tracer = _tracer
+    end_args = {}
+    if tracer is None:
+        yield end_args
+        return
+    tracer.begin(name, args)
+    try:
+        yield end_args
+    finally:
+        tracer.end(end_args)
+
+
+def _counted_filter(filter_symbol):
+    """Wraps `filter_symbol` to count its calls, if tracing is enabled"""
+    if (_tracer is None or filter_symbol is _default_filter_symbol or
+            isinstance(filter_symbol, _OnceFilter) or
+            getattr(filter_symbol, '_counted', False)):
+        return filter_symbol
+
+    def counted_filter_symbol(t, name):
+        tracer = _tracer
+        if tracer is not None:
+            tracer.count('filter_symbol')
+        return filter_symbol(t, name)
+    counted_filter_symbol._counted = True
+    return counted_filter_symbol
+
+
+# Compiled form of the templates rendered so far. Emptied once it holds
+# _MAX_COMPILED_TEMPLATES templates, so that long running processes loading
+# many registries do not accumulate templates forever.
+_compiled_templates = {}
+_MAX_COMPILED_TEMPLATES = 4096
+_simple_field = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _compile_template(template):
+    """Splits format string `template` into a tuple of ``(literal, field)``
+    pairs, where `field` is a field name or None. Returns None if `template`
+    uses anything other than plain named fields."""
+    try:
+        return _compiled_templates[template]
+    except KeyError:
+        pass
+    out = []
+    for literal, field, spec, conversion in string.Formatter().parse(
+            template):
+        if field is not None and (spec or conversion or
+                                  not _simple_field.match(field)):
+            out = None
+            break
+        out.append((literal, field))
+    if out is not None:
+        out = tuple(out)
+    if len(_compiled_templates) >= _MAX_COMPILED_TEMPLATES:
+        _compiled_templates.clear()
+    _compiled_templates[template] = out
+    return out
+
+
+def _render(template, **kwargs):
+    """Equivalent to ``template.format(**kwargs)``"""
+    compiled = _compile_template(template)
+    if compiled is None:
+        return template.format(**kwargs)
+    out = []
+    for literal, field in compiled:
+        out.append(literal)
+        if field is not None:
+            x = kwargs[field]
+            out.append(x if type(x) is str else format(x, ''))
+    return ''.join(out)
+
+
+def _text_property(name, cache):
+    """Returns property for attribute `name` which discards the rendered text
+    cached in attribute `cache` when it is set"""
+    slot = '_' + name
+
+    def fget(self):
+        return getattr(self, slot)
+
+    def fset(self, value):
+        setattr(self, slot, value)
+        setattr(self, cache, None)
+    return property(fget, fset)
+
+
 class Type(object):
+    __slots__ = ('_name', '_template', 'required_types', 'api', 'comment',
+                 '_text')
+
+    name = _text_property('name', '_text')
+    template = _text_property('template', '_text')
+
     def __init__(self, name, template, required_types=None, api=None,
                  comment=None):
         #: Type name
@@ -157,14 +392,41 @@ class Type(object):
         Equivalent to ``self.template.format(name=self.name,
         apientry='APIENTRY')``
         """
-        return self.template.format(name=self.name, apientry='APIENTRY')
+        if self._text is None:
+            self._text = _render(self._template, name=self._name,
+                                 apientry='APIENTRY')
+        return self._text
 
     def __repr__(self):
         return _repr(self, (self.name, self.template),
                      (self.required_types, self.api, self.comment))
 
 
+_int_literal = re.compile(r'''^\s*(-?)
+    (0[xX][0-9A-Fa-f]+|0[0-7]*|[1-9][0-9]*)  # Hexadecimal, octal or decimal
+    (?:[uU](?:ll|LL|[lL])?|(?:ll|LL|[lL])[uU]?)?  # Suffix
+    \s*$''', re.VERBOSE)
+
+
+def _parse_int(x):
+    """Returns the value of C integer literal `x`, or None if `x` is not an
+    integer literal"""
+    m = _int_literal.match(x)
+    if not m:
+        return None
+    digits = m.group(2)
+    if digits[1:2] in ('x', 'X'):
+        out = int(digits, 16)
+    elif digits[0] == '0':
+        out = int(digits, 8)
+    else:
+        out = int(digits, 10)
+    return -out if m.group(1) else out
+
+
 class Enum(object):
+    __slots__ = ('name', '_value', '_int_value', 'comment')
+
     def __init__(self, name, value, comment=None):
         #: Enum name
         self.name = str(name)
@@ -173,6 +435,26 @@ class Enum(object):
         #: Optional comment
         self.comment = comment
 
+    @property
+    def value(self):
+        """Enum string value"""
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._value = value
+        self._int_value = _parse_int(str(value))
+
+    @property
+    def int_value(self):
+        """Integer value of :py:attr:`value`, or None if it is not an integer
+        literal
+
+        Hexadecimal, octal and decimal literals with C integer suffixes are
+        supported.
+        """
+        return self._int_value
+
     @property
     def text(self):
         """Formatted enum C definition
@@ -186,6 +468,13 @@ class Enum(object):
 
 
 class Command(object):
+    __slots__ = ('_name', '_type', '_proto_template', 'params', 'comment',
+                 '_proto_text')
+
+    name = _text_property('name', '_proto_text')
+    type = _text_property('type', '_proto_text')
+    proto_template = _text_property('proto_template', '_proto_text')
+
     def __init__(self, name, type, proto_template, params, comment=None):
         #: Command name
         self.name = str(name)
@@ -214,7 +503,10 @@ class Command(object):
         Equivalent to ``self.proto_template.format(type=self.type,
         name=self.name)``.
         """
-        return self.proto_template.format(type=self.type, name=self.name)
+        if self._proto_text is None:
+            self._proto_text = _render(self._proto_template, type=self._type,
+                                       name=self._name)
+        return self._proto_text
 
     @property
     def text(self):
@@ -222,8 +514,8 @@ class Command(object):
 
         This is the C declaration for the command.
         """
-        params = ', '.join(x.text for x in self.params)
-        return '{0} ({1})'.format(self.proto_text, params)
+        params = ', '.join([x.text for x in self.params])
+        return self.proto_text + ' (' + params + ')'
 
     def __repr__(self):
         return _repr(self, (self.name, self.type, self.proto_template,
@@ -231,6 +523,12 @@ class Command(object):
 
 
 class Param(object):
+    __slots__ = ('_name', '_type', '_template', '_text')
+
+    name = _text_property('name', '_text')
+    type = _text_property('type', '_text')
+    template = _text_property('template', '_text')
+
     def __init__(self, name, type, template):
         #: Param name
         self.name = name
@@ -245,7 +543,10 @@ class Param(object):
 
         Equivalent to ``self.template.format(name=self.name, type=self.type)``.
         """
-        return self.template.format(name=self.name, type=self.type)
+        if self._text is None:
+            self._text = _render(self._template, name=self._name,
+                                 type=self._type)
+        return self._text
 
     def __repr__(self):
         return _repr(self, (self.name, self.type, self.template))
@@ -256,6 +557,8 @@ class Require(object):
 
     """
 
+    __slots__ = ('types', 'enums', 'commands', 'profile', 'api', 'comment')
+
     def __init__(self, types, enums, commands, profile=None, api=None,
                  comment=None):
         #: List of type names which this Require requires
@@ -295,6 +598,8 @@ class Remove(object):
 
     """
 
+    __slots__ = ('types', 'enums', 'commands', 'profile', 'comment')
+
     def __init__(self, types, enums, commands, profile=None, comment=None):
         #: List of type names of Types to remove
         self.types = types
@@ -331,6 +636,8 @@ class Feature(object):
 
     """
 
+    __slots__ = ('name', 'api', 'number', 'requires', 'removes', 'comment')
+
     def __init__(self, name, api, number, requires, removes, comment=None):
         #: Feature name
         self.name = name
@@ -403,6 +710,8 @@ class Extension(object):
 
     """
 
+    __slots__ = ('name', 'supported', 'requires', 'comment')
+
     def __init__(self, name, supported, requires, comment=None):
         #: Extension name
         self.name = name
@@ -462,7 +771,7 @@ class Extension(object):
                      (self.comment,))
 
 
-class Registry:
+class Registry(object):
     """API Registry
 
     """
@@ -481,6 +790,35 @@ class Registry:
         self.features = collections.OrderedDict(features or ())
         #: Mapping of extension names to `Extension` objects
         self.extensions = collections.OrderedDict(extensions or ())
+        # Indexes built on demand from the contents of this Registry
+        self._cache = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = {}
+
+    def _cached(self, key, build):
+        """Returns index `key`, building it with `build()` on first use"""
+        try:
+            return self._cache[key]
+        except KeyError:
+            out = self._cache[key] = build()
+            return out
+
+    def clear_cache(self):
+        """Discards the indexes built from the contents of this Registry.
+
+        Indexes such as the one used by :meth:`get_removed_symbols` are built
+        on first use. They must be discarded when the types, enums, commands,
+        features or extensions of this Registry are modified directly. The
+        ``import_*`` functions do this for their destination Registry.
+        """
+        self._cache.clear()
 
     @property
     def text(self):
@@ -489,12 +827,19 @@ class Registry:
         Equivalent to the concatenation of `text` attributes of
         types, enums and commands in this Registry.
         """
-        out = []
-        out.extend(x.text for x in self.types.values())
-        out.extend(x.text for x in self.enums.values())
-        out.extend('extern {0};'.format(x.text)
-                   for x in self.commands.values())
-        return '\n'.join(out)
+        return '\n'.join(self.iter_text())
+
+    def iter_text(self):
+        """Yields the lines of :py:attr:`text` one at a time
+
+        :return: iterator of strs
+        """
+        for x in self.types.values():
+            yield x.text
+        for x in self.enums.values():
+            yield x.text
+        for x in self.commands.values():
+            yield 'extern {0};'.format(x.text)
 
     def get_type(self, name, api=None):
         """Returns Type `name`, with preference for the Type of `api`.
@@ -510,6 +855,101 @@ class Registry:
         else:
             return self.types[(name, None)]
 
+    def _get_type_tree(self, name, api=None):
+        """Returns the dependency tree of Type `name` in pre-order
+
+        Dependencies are visited in sorted order. A dependency on a Type which
+        is already being visited is ignored.
+
+        :return: tuple of ``(type name, Type, end)`` tuples, where `end` is
+                 the index following the last dependency of the entry, and
+                 Type is None if there is no such type.
+        """
+        def build():
+            out = []
+            path = set()
+            # Names to visit, and (name, index) markers of visited entries
+            # whose dependencies have all been visited.
+            stack = [(name, None)]
+            while stack:
+                x, i = stack.pop()
+                if i is not None:
+                    out[i] = (x, out[i][1], len(out))
+                    path.discard(x)
+                    continue
+                try:
+                    t = self.get_type(x, api)
+                except KeyError:
+                    t = None
+                path.add(x)
+                stack.append((x, len(out)))
+                out.append((x, t, None))
+                if t is not None:
+                    stack.extend((y, None) for y in
+                                 sorted(t.required_types, reverse=True)
+                                 if y not in path)
+            return tuple(out)
+        return self._cached(('type_tree', name, api), build)
+
+    def get_type_closure(self, name, api=None):
+        """Returns Type `name` and all the Types it depends on, directly or
+        indirectly, with every Type following the Types it depends on.
+
+        The closure is computed once per `name` and `api` and then reused.
+
+        :param str name: Type name
+        :param str api: api name to prefer, or None to prefer types with no
+                        api name
+        :return: tuple of Type objects
+        """
+        def build():
+            out = collections.OrderedDict()
+            pending = []
+            for i, (x, t, end) in enumerate(self._get_type_tree(name, api)):
+                while pending and pending[-1][0] <= i:
+                    t2 = pending.pop()[1]
+                    out[(t2.name, t2.api)] = t2
+                if t is None:
+                    self.get_type(x, api)  # Raises KeyError
+                pending.append((end, t))
+            while pending:
+                t2 = pending.pop()[1]
+                out[(t2.name, t2.api)] = t2
+            return tuple(out.values())
+        return self._cached(('type_closure', name, api), build)
+
+    def get_command_types(self, name, api=None):
+        """Returns all the Types which Command `name` depends on, directly or
+        indirectly, with every Type following the Types it depends on.
+
+        The Types are computed once per `name` and `api` and then reused.
+
+        :param str name: Command name
+        :param str api: api name to prefer, or None to prefer types with no
+                        api name
+        :return: tuple of Type objects
+        """
+        def build():
+            out = collections.OrderedDict()
+            for x in self.get_command_type_names(name):
+                for t in self.get_type_closure(x, api):
+                    out[(t.name, t.api)] = t
+            return tuple(out.values())
+        return self._cached(('command_types', name, api), build)
+
+    def get_command_type_names(self, name):
+        """Returns the sorted names of the types which Command `name` directly
+        depends on
+
+        The names are computed once per `name` and then reused.
+
+        :param str name: Command name
+        :return: tuple of str
+        """
+        return self._cached(
+            ('command_type_names', name),
+            lambda: tuple(sorted(self.commands[name].required_types)))
+
     def get_features(self, api=None):
         """Returns filtered list of features in this registry
 
@@ -565,6 +1005,131 @@ class Registry:
             out.extend(ft.get_removes(profile))
         return out
 
+    def get_removed_symbols(self, api=None, profile=None):
+        """Returns set of symbols removed by the features in this registry
+
+        The set is computed once per `api` and `profile` and then reused.
+
+        :param str api: Use Remove objects with this api name or None to
+                        use all Remove objects.
+        :param str profile: Use Remove objects with this profile or None to
+                            use all Remove objects.
+        :return: frozenset of ``(symbol type, symbol name)`` tuples
+        """
+        def build():
+            out = set()
+            for x in self.get_removes(api, profile):
+                out.update(x.as_symbols())
+            return frozenset(out)
+        return self._cached(('removed_symbols', api, profile), build)
+
+    def _requiring_index(self):
+        """Returns {(symbol type, symbol name): [Feature or Extension]}"""
+        def build():
+            out = collections.defaultdict(list)
+            for x in itertools.chain(self.features.values(),
+                                     self.extensions.values()):
+                for req in x.requires:
+                    for symbol in req.as_symbols():
+                        lst = out[symbol]
+                        if not lst or lst[-1] is not x:
+                            lst.append(x)
+            return out
+        return self._cached('requiring', build)
+
+    def _dependents_index(self):
+        """Returns {type name: ([Type], [Command])}"""
+        def build():
+            out = collections.defaultdict(lambda: ([], []))
+            for x in self.types.values():
+                for name in x.required_types:
+                    out[name][0].append(x)
+            for x in self.commands.values():
+                for name in x.required_types:
+                    out[name][1].append(x)
+            return out
+        return self._cached('dependents', build)
+
+    def get_requiring(self, symbol_type, name):
+        """Returns features and extensions which require a symbol
+
+        :param str symbol_type: ``'type'``, ``'enum'`` or ``'command'``
+        :param str name: Symbol name
+        :return: list of Feature objects followed by Extension objects, in
+                 registry order
+        """
+        return list(self._requiring_index().get((symbol_type, name), ()))
+
+    def get_introducing_feature(self, symbol_type, name, api=None):
+        """Returns the first feature which requires a symbol
+
+        :param str symbol_type: ``'type'``, ``'enum'`` or ``'command'``
+        :param str name: Symbol name
+        :param str api: Only consider features with this api name, or None to
+                        consider all features.
+        :return: Feature object, or None if no feature requires the symbol
+        """
+        for x in self._requiring_index().get((symbol_type, name), ()):
+            if isinstance(x, Feature) and (not api or x.api == api):
+                return x
+        return None
+
+    def get_dependent_types(self, name):
+        """Returns types which directly depend on Type `name`
+
+        :param str name: Type name
+        :return: list of Type objects, in registry order
+        """
+        return list(self._dependents_index().get(name, ([], []))[0])
+
+    def get_dependent_commands(self, name):
+        """Returns commands which directly depend on Type `name`, as their
+        return type or the type of one of their params.
+
+        :param str name: Type name
+        :return: list of Command objects, in registry order
+        """
+        return list(self._dependents_index().get(name, ([], []))[1])
+
+    def select(self, api=None, profile=None, support=None):
+        """Returns a read-only view of the symbols of this Registry which
+        :py:func:`import_registry` would import
+
+        :param str api: Select Features with api name `api`, or None to
+                        select all Features.
+        :param str profile: Select Features with profile name `profile`, or
+                            None to select all Features.
+        :param str support: Select Extensions with this extension support
+                            string, or None to select all Extensions.
+        :return: :py:class:`RegistryView`
+        """
+        return RegistryView(self, api, profile, support)
+
+    def get_enum_names(self, value):
+        """Returns the names of the Enums with integer value `value`
+
+        The value to names index is built once and then reused.
+
+        :param int value: Enum integer value
+        :return: tuple of Enum names, in registry order
+        """
+        def build():
+            out = collections.defaultdict(list)
+            for x in self.enums.values():
+                if x.int_value is not None:
+                    out[x.int_value].append(x.name)
+            return dict((k, tuple(v)) for k, v in out.items())
+        return self._cached('enum_names', build).get(value, ())
+
+    def get_symbol_index(self):
+        """Returns the :py:class:`SymbolIndex` of this Registry
+
+        The index is built once and then reused.
+
+        :return: SymbolIndex object
+        """
+        return self._cached('symbol_index', lambda: SymbolIndex(self))
+
     def get_apis(self):
         """Returns set of api names referenced in this Registry
 
@@ -604,6 +1169,274 @@ class Registry:
                      self.commands, self.features, self.extensions))
 
 
+class _SectionView(Mapping):
+    """Read-only mapping of the items of `source` with keys in `keys`"""
+
+    def __init__(self, source, keys):
+        self._source = source
+        self._keys = keys
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._source[key]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        keys = self._keys
+        return (k for k in self._source if k in keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return repr(collections.OrderedDict(self.items()))
+
+
+def _view_section(name):
+    """Returns RegistryView attribute for section `name`"""
+    def fget(self):
+        return self._cached(('section', name), lambda: _SectionView(
+            getattr(self.registry, name), self._get_keys()[name]))
+    return property(fget)
+
+
+class RegistryView(Registry):
+    """Read-only view of the symbols of a Registry which
+    :py:func:`import_registry` would import
+
+    The sections of the view are mappings which filter the sections of the
+    source Registry, without copying them. They iterate in the order of the
+    source Registry. The selected symbols are computed with the
+    :py:class:`SymbolIndex` of the source Registry on first access of a
+    section. Later modifications of the source are only reflected after
+    :py:meth:`clear_cache` is called. Symbols which are not defined in the
+    source Registry are ignored.
+
+    :param Registry registry: Source Registry
+    :param str api: Select Features with api name `api`, or None to select
+                    all Features.
+    :param str profile: Select Features with profile name `profile`, or None
+                        to select all Features.
+    :param str support: Select Extensions with this extension support string,
+                        or None to select all Extensions.
+    """
+
+    types = _view_section('types')
+    enums = _view_section('enums')
+    commands = _view_section('commands')
+    features = _view_section('features')
+    extensions = _view_section('extensions')
+
+    def __init__(self, registry, api=None, profile=None, support=None):
+        #: Optional API name (or None)
+        self.name = registry.name
+        #: Source Registry
+        self.registry = registry
+        #: Selected api name
+        self.api = api
+        #: Selected profile name
+        self.profile = profile
+        #: Selected extension support string
+        self.support = support
+        self._cache = {}
+
+    def _get_keys(self):
+        """Returns {section name: frozenset of selected keys}"""
+        def build():
+            src, api = self.registry, self.api
+            index = src.get_symbol_index()
+            names = {'type': set(), 'enum': set(), 'command': set()}
+            for t, name in index.decode(index.resolve(api, self.profile,
+                                                      self.support)):
+                names[t].add(name)
+            commands = frozenset(x for x in names['command']
+                                 if x in src.commands)
+            type_names = set(names['type'])
+            for x in commands:
+                type_names.update(src.get_command_type_names(x))
+            types = set()
+            for x in type_names:
+                types.update((t.name, t.api) for _, t, _ in
+                             src._get_type_tree(x, api) if t is not None)
+            return {
+                'types': frozenset(types),
+                'enums': frozenset(x for x in names['enum']
+                                   if x in src.enums),
+                'commands': commands,
+                'features': frozenset(x.name for x in
+                                      src.get_features(api)),
+                'extensions': frozenset(x.name for x in
+                                        src.get_extensions(self.support))}
+        return self._cached('keys', build)
+
+    def clear_cache(self):
+        """Discards the symbols selected by this view, and the indexes of the
+        source Registry they were computed from."""
+        self._cache.clear()
+        self.registry.clear_cache()
+
+
+class SymbolIndex(object):
+    """Dense integer IDs of the symbols of a Registry
+
+    Every type, enum and command name gets an ID, in registry order. Sets of
+    symbols are represented as bitsets: ints whose bit ``i`` is set if the
+    symbol with ID ``i`` is in the set. Unions, intersections and differences
+    of symbol sets are thus the ``|``, ``&`` and ``& ~`` operators.
+
+    The bitsets of Require and Remove objects are computed once and then
+    reused.
+
+    :param Registry registry: Registry to index
+    """
+
+    def __init__(self, registry):
+        #: Indexed Registry
+        self.registry = registry
+        #: List of ``(symbol type, symbol name)`` tuples, indexed by ID
+        self.symbols = []
+        self._ids = {}
+        self._bits = {}
+        for (name, api) in registry.types:
+            self.get_id('type', name)
+        for name in registry.enums:
+            self.get_id('enum', name)
+        for name in registry.commands:
+            self.get_id('command', name)
+
+    def get_id(self, symbol_type, name):
+        """Returns the ID of a symbol
+
+        Symbols which are not defined in the Registry, but are referenced by
+        its Require and Remove objects, get an ID on first use.
+
+        :param str symbol_type: ``'type'``, ``'enum'`` or ``'command'``
+        :param str name: Symbol name
+        :return: int
+        """
+        k = (symbol_type, name)
+        try:
+            return self._ids[k]
+        except KeyError:
+            out = self._ids[k] = len(self.symbols)
+            self.symbols.append(k)
+            return out
+
+    def get_bits(self, symbols):
+        """Returns the bitset of `symbols`
+
+        :param symbols: Iterable of ``(symbol type, symbol name)`` tuples
+        :return: int
+        """
+        out = 0
+        for t, name in symbols:
+            out |= 1 << self.get_id(t, name)
+        return out
+
+    def get_require_bits(self, require):
+        """Returns the bitset of the symbols of a Require or Remove object
+
+        :param require: Require or Remove object
+        :return: int
+        """
+        try:
+            return self._bits[require]
+        except KeyError:
+            out = self._bits[require] = self.get_bits(require.as_symbols())
+            return out
+
+    def _union(self, requires):
+        out = 0
+        for x in requires:
+            out |= self.get_require_bits(x)
+        return out
+
+    def get_feature_bits(self, name, profile=None):
+        """Returns the bitset of the symbols required by Feature `name`
+
+        :param str name: Feature name
+        :param str profile: Use Require objects with this profile, or None to
+                            use all Require objects.
+        :return: int
+        """
+        return self._union(
+            self.registry.features[name].get_requires(profile))
+
+    def get_extension_bits(self, name, api=None, profile=None):
+        """Returns the bitset of the symbols required by Extension `name`
+
+        :param str name: Extension name
+        :param str api: Use Require objects with this api name, or None to use
+                        all Require objects.
+        :param str profile: Use Require objects with this profile, or None to
+                            use all Require objects.
+        :return: int
+        """
+        return self._union(
+            self.registry.extensions[name].get_requires(api, profile))
+
+    def get_remove_bits(self, api=None, profile=None):
+        """Returns the bitset of the symbols removed by the Features with
+        api name `api`
+
+        :param str api: Use Features with this api name, or None to use all
+                        Features.
+        :param str profile: Use Remove objects with this profile, or None to
+                            use all Remove objects.
+        :return: int
+        """
+        return self._union(self.registry.get_removes(api, profile))
+
+    def resolve(self, api=None, profile=None, support=None, extensions=None):
+        """Returns the bitset of the symbols which :py:func:`import_registry`
+        would import, excluding the types they depend on
+
+        :param str api: Use Features with this api name, or None to use all
+                        Features.
+        :param str profile: Use Require and Remove objects with this profile,
+                            or None to use all of them.
+        :param str support: Use Extensions with this extension support
+                            string, or None to use all Extensions.
+                            Ignored if `extensions` is given.
+        :param extensions: Names of Extensions to use, or None to use the
+                           Extensions selected by `support`.
+        :type extensions: Iterable of strs
+        :return: int
+        """
+        out = 0
+        for x in self.registry.get_features(api):
+            out |= self._union(x.get_requires(profile))
+        out &= ~self.get_remove_bits(api, profile)
+        if extensions is None:
+            extensions = [x.name for x in
+                          self.registry.get_extensions(support)]
+        for x in extensions:
+            out |= self.get_extension_bits(x, api, profile)
+        return out
+
+    def decode(self, bits):
+        """Returns the symbols of a bitset
+
+        :param int bits: Bitset
+        :return: list of ``(symbol type, symbol name)`` tuples, in ID order
+        """
+        symbols = self.symbols
+        return [symbols[i] for i, c in enumerate(bin(bits)[:1:-1])
+                if c == '1']
+
+    @staticmethod
+    def count(bits):
+        """Returns the number of symbols in a bitset
+
+        :param int bits: Bitset
+        :return: int
+        """
+        return bin(bits).count('1')
+
+
 def _escape_tpl_str(x):
     def repl_f(match):
         if match.group(0) == '{':
@@ -613,18 +1446,65 @@ def _escape_tpl_str(x):
     return re.sub('[{}]', repl_f, x)
 
 
-def _load(root):
-    """Load from an xml.etree.ElementTree"""
-    types = _load_types(root)
-    enums = _load_enums(root)
-    commands = _load_commands(root)
-    features = _load_features(root)
-    extensions = _load_extensions(root)
-    return Registry(None, types, enums, commands, features, extensions)
+class StringPool(object):
+    """Pool of strings shared by the objects of loaded registries
+
+    Registry files repeat the same names many times: command names in
+    `Require` lists, api and profile names, param types and templates. When
+    loading, each string is looked up in the pool so that every distinct
+    string is only stored once. A pool may be shared by several registries.
+    """
 
+    def __init__(self):
+        self._strings = {}
+        #: Number of strings which were replaced by an equal pooled string
+        self.deduplicated = 0
 
-def _load_types(root):
-    """Returns {name: Type}"""
+    def __call__(self, s):
+        """Returns the pooled string equal to `s`
+
+        :param s: String, or None
+        :return: Pooled string, or None if `s` is None
+        """
+        if s is None:
+            return None
+        x = self._strings.setdefault(s, s)
+        if x is not s:
+            self.deduplicated += 1
+        return x
+
+    def __len__(self):
+        return len(self._strings)
+
+    def __repr__(self):
+        return _repr(self, (len(self), self.deduplicated))
+
+
+def _load(root, pool=None):
+    """Load from an xml.etree.ElementTree
+
+    The children of the root element are visited once, in document order,
+    and each run of sections with the same tag is passed to its loader.
+    """
+    if pool is None:
+        pool = StringPool()
+    if hasattr(root, 'getroot'):
+        root = root.getroot()
+    out = dict((k, collections.OrderedDict()) for k in _section_loaders)
+    for tag, elems in itertools.groupby(root, operator.attrgetter('tag')):
+        loader = _section_loaders.get(tag)
+        if loader is None:
+            continue
+        phase, add = loader
+        with _phase(phase):
+            for elem in elems:
+                add(elem, pool, out[tag])
+    return Registry(None, out['types'], out['enums'], out['commands'],
+                    out['feature'], out['extensions'])
+
+
+def _load_type(elem, pool):
+    """Returns Type"""
     def text(t):
         if t.tag == 'name':
             return '{name}'
@@ -638,36 +1518,52 @@ def _load_types(root):
             if x.tail:
                 out.append(_escape_tpl_str(x.tail))
         return ''.join(out)
-    out_dict = collections.OrderedDict()
-    for elem in root.findall('types/type'):
-        name = elem.get('name') or elem.find('name').text
-        template = text(elem)
-        api = elem.get('api')
-        if 'requires' in elem.attrib:
-            required_types = set((elem.attrib['requires'],))
-        else:
-            required_types = set()
-        comment = elem.get('comment')
-        if api:
-            k = (name, api)
-        else:
-            k = (name, None)
-        out_dict[k] = Type(name, template, required_types, api, comment)
-    return out_dict
+    name = pool(elem.get('name') or elem.find('name').text)
+    template = text(elem)
+    api = pool(elem.get('api'))
+    if 'requires' in elem.attrib:
+        required_types = set((pool(elem.attrib['requires']),))
+    else:
+        required_types = set()
+    comment = elem.get('comment')
+    return Type(name, template, required_types, api, comment)
+
+
+def _add_types(section, pool, out):
+    """Adds the Types of a ``<types>`` element to `out`"""
+    for elem in section:
+        if elem.tag == 'type':
+            x = _load_type(elem, pool)
+            out[(x.name, x.api)] = x
+
+
+def _load_types(root, pool=None):
+    """Returns {name: Type}"""
+    return _load_section(root, 'types', pool)
+
+
+def _load_enum(elem, pool):
+    """Returns Enum"""
+    name = pool(elem.attrib['name'])
+    value = pool(elem.attrib['value'])
+    comment = elem.get('comment')
+    return Enum(name, value, comment)
 
 
-def _load_enums(root):
+def _add_enums(section, pool, out):
+    """Adds the Enums of an ``<enums>`` element to `out`"""
+    for elem in section:
+        if elem.tag == 'enum':
+            x = _load_enum(elem, pool)
+            out[x.name] = x
+
+
+def _load_enums(root, pool=None):
     """Returns {name: Enum}"""
-    out = collections.OrderedDict()
-    for elem in root.findall('enums/enum'):
-        name = elem.attrib['name']
-        value = elem.attrib['value']
-        comment = elem.get('comment')
-        out[name] = Enum(name, value, comment)
-    return out
+    return _load_section(root, 'enums', pool)
 
 
-def _load_param(elem):
+def _load_param(elem, pool):
     def text(t):
         if t.tag == 'name':
             return '{name}'
@@ -681,15 +1577,15 @@ def _load_param(elem):
             if x.tail:
                 out.append(_escape_tpl_str(x.tail))
         return ''.join(out)
-    name = elem.find('name').text
+    name = pool(elem.find('name').text)
     type_elem = elem.find('ptype')
-    type = type_elem.text if type_elem is not None else None
-    template = text(elem)
+    type = pool(type_elem.text) if type_elem is not None else None
+    template = pool(text(elem))
     return Param(name, type, template)
 
 
-def _load_commands(root):
-    """Returns {name: Command}"""
+def _load_command(elem, pool):
+    """Returns Command"""
     def proto_text(t):
         if t.tag == 'name':
             return '{name}'
@@ -703,81 +1599,804 @@ def _load_commands(root):
             if x.tail:
                 out.append(_escape_tpl_str(x.tail))
         return ''.join(out)
-    out = collections.OrderedDict()
-    for elem in root.findall('commands/command'):
-        type_elem = elem.find('proto/ptype')
-        name = elem.get('name') or elem.find('proto/name').text
-        type = type_elem.text if type_elem is not None else None
-        proto_template = proto_text(elem.find('proto'))
-        params = [_load_param(x) for x in elem.findall('param')]
-        comment = elem.get('comment')
-        out[name] = Command(name, type, proto_template, params, comment)
-    return out
+    proto = None
+    params = []
+    for x in elem:
+        if x.tag == 'param':
+            params.append(_load_param(x, pool))
+        elif x.tag == 'proto' and proto is None:
+            proto = x
+    type_elem = proto.find('ptype')
+    name = pool(elem.get('name') or proto.find('name').text)
+    type = pool(type_elem.text) if type_elem is not None else None
+    proto_template = pool(proto_text(proto))
+    comment = elem.get('comment')
+    return Command(name, type, proto_template, params, comment)
 
 
-def _load_require(elem):
-    types = [x.attrib['name'] for x in elem.findall('type')]
-    enums = [x.attrib['name'] for x in elem.findall('enum')]
-    commands = [x.attrib['name'] for x in elem.findall('command')]
-    profile = elem.get('profile')
-    api = elem.get('api')
+def _add_commands(section, pool, out):
+    """Adds the Commands of a ``<commands>`` element to `out`"""
+    for elem in section:
+        if elem.tag == 'command':
+            x = _load_command(elem, pool)
+            out[x.name] = x
+
+
+def _load_commands(root, pool=None):
+    """Returns {name: Command}"""
+    return _load_section(root, 'commands', pool)
+
+
+def _load_require_names(elem, pool):
+    """Returns the type, enum and command names listed by a ``<require>`` or
+    ``<remove>`` element, in a single pass over its children"""
+    types, enums, commands = [], [], []
+    lists = {'type': types, 'enum': enums, 'command': commands}
+    for x in elem:
+        names = lists.get(x.tag)
+        if names is not None:
+            names.append(pool(x.attrib['name']))
+    return types, enums, commands
+
+
+def _load_require(elem, pool):
+    types, enums, commands = _load_require_names(elem, pool)
+    profile = pool(elem.get('profile'))
+    api = pool(elem.get('api'))
     comment = elem.get('comment')
     return Require(types, enums, commands, profile, api, comment)
 
 
-def _load_remove(elem):
-    types = [x.attrib['name'] for x in elem.findall('type')]
-    enums = [x.attrib['name'] for x in elem.findall('enum')]
-    commands = [x.attrib['name'] for x in elem.findall('command')]
-    profile = elem.get('profile')
+def _load_remove(elem, pool):
+    types, enums, commands = _load_require_names(elem, pool)
+    profile = pool(elem.get('profile'))
     comment = elem.get('comment')
     return Remove(types, enums, commands, profile, comment)
 
 
-def _load_features(root):
+def _load_feature(elem, pool):
+    """Returns Feature"""
+    name = pool(elem.attrib['name'])
+    api = pool(elem.attrib['api'])
+    number = tuple([int(x) for x in elem.attrib['number'].split('.')])
+    requires = []
+    removes = []
+    for x in elem:
+        if x.tag == 'require':
+            requires.append(_load_require(x, pool))
+        elif x.tag == 'remove':
+            removes.append(_load_remove(x, pool))
+    comment = elem.get('comment')
+    return Feature(name, api, number, requires, removes, comment)
+
+
+def _add_feature(elem, pool, out):
+    """Adds the Feature of a ``<feature>`` element to `out`"""
+    x = _load_feature(elem, pool)
+    out[x.name] = x
+
+
+def _load_features(root, pool=None):
     """Returns {name: Feature}"""
-    out = collections.OrderedDict()
-    for elem in root.findall('feature'):
-        name = elem.attrib['name']
-        api = elem.attrib['api']
-        number = tuple([int(x) for x in elem.attrib['number'].split('.')])
-        requires = [_load_require(x) for x in elem.findall('require')]
-        removes = [_load_remove(x) for x in elem.findall('remove')]
-        comment = elem.get('comment')
-        out[name] = Feature(name, api, number, requires, removes, comment)
-    return out
+    return _load_section(root, 'feature', pool)
 
 
-def _load_extensions(root):
+def _load_extension(elem, pool):
+    """Returns Extension"""
+    name = pool(elem.attrib['name'])
+    supported = set(pool(x) for x in elem.attrib['supported'].split('|'))
+    requires = [_load_require(x, pool) for x in elem if x.tag == 'require']
+    comment = elem.get('comment')
+    return Extension(name, supported, requires, comment)
+
+
+def _add_extensions(section, pool, out):
+    """Adds the Extensions of an ``<extensions>`` element to `out`"""
+    for elem in section:
+        if elem.tag == 'extension':
+            x = _load_extension(elem, pool)
+            out[x.name] = x
+
+
+def _load_extensions(root, pool=None):
     """Returns {name: Extension}"""
+    return _load_section(root, 'extensions', pool)
+
+
+# Maps the tags of the children of the registry element to the name of their
+# tracing phase and to their loader
+_section_loaders = {'types': ('_load_types', _add_types),
+                    'enums': ('_load_enums', _add_enums),
+                    'commands': ('_load_commands', _add_commands),
+                    'feature': ('_load_features', _add_feature),
+                    'extensions': ('_load_extensions', _add_extensions)}
+
+
+def _load_section(root, tag, pool=None):
+    """Returns {name: object} of the registry sections tagged `tag`"""
+    if pool is None:
+        pool = StringPool()
     out = collections.OrderedDict()
-    for elem in root.findall('extensions/extension'):
-        name = elem.attrib['name']
-        supported = set(elem.attrib['supported'].split('|'))
-        requires = [_load_require(x) for x in elem.findall('require')]
-        comment = elem.get('comment')
-        out[name] = Extension(name, supported, requires, comment)
+    add = _section_loaders[tag][1]
+    for elem in root.findall(tag):
+        add(elem, pool, out)
     return out
 
 
-def load(f):
+class _StreamLoader(object):
+    """Builds a Registry from ElementTree ``start`` and ``end`` events.
+
+    Types, enums, commands, features and extensions are built as soon as their
+    element is closed. The element is then removed from its parent, so the
+    full element tree is never held in memory at once.
+    """
+
+    def __init__(self, pool=None):
+        #: Registry being built
+        self.registry = Registry()
+        self._pool = pool if pool is not None else StringPool()
+        self._stack = []
+
+    def feed(self, events):
+        """Process ``(event, element)`` pairs
+
+        :param events: Iterable of ``('start', element)`` and
+                       ``('end', element)`` pairs
+        """
+        stack = self._stack
+        reg = self.registry
+        pool = self._pool
+        for event, elem in events:
+            if event == 'start':
+                stack.append(elem)
+                continue
+            stack.pop()
+            if len(stack) == 2:
+                section = stack[1]
+                if section.tag == 'feature':
+                    # require/remove elements are needed by the feature
+                    continue
+                if section.tag == 'types' and elem.tag == 'type':
+                    x = _load_type(elem, pool)
+                    reg.types[(x.name, x.api)] = x
+                elif section.tag == 'enums' and elem.tag == 'enum':
+                    x = _load_enum(elem, pool)
+                    reg.enums[x.name] = x
+                elif section.tag == 'commands' and elem.tag == 'command':
+                    x = _load_command(elem, pool)
+                    reg.commands[x.name] = x
+                elif (section.tag == 'extensions' and
+                      elem.tag == 'extension'):
+                    x = _load_extension(elem, pool)
+                    reg.extensions[x.name] = x
+                section.remove(elem)
+            elif len(stack) == 1:
+                if elem.tag == 'feature':
+                    x = _load_feature(elem, pool)
+                    reg.features[x.name] = x
+                stack[0].remove(elem)
+
+
+def _iterload(source, pool=None):
+    """Load from a file using xml.etree.ElementTree.iterparse"""
+    loader = _StreamLoader(pool)
+    loader.feed(xml.etree.ElementTree.iterparse(source, ('start', 'end')))
+    return loader.registry
+
+
+class _ExpatLoader(object):
+    """Builds a Registry directly from :py:mod:`xml.parsers.expat` callbacks.
+
+    Builds the same objects as ``_load()`` in a single pass, without creating
+    any XML element. Each section of the registry installs its own element
+    handlers on the parser, so that every callback only does the work
+    relevant to its section.
+    """
+
+    # Placeholders of the elements of each kind of template
+    _placeholders = {'type': {'name': '{name}', 'apientry': '{apientry}'},
+                     'proto': {'name': '{name}', 'ptype': '{type}'},
+                     'param': {'name': '{name}', 'ptype': '{type}'}}
+
+    def __init__(self, pool=None):
+        #: Registry being built
+        self.registry = Registry()
+        self._pool = pool if pool is not None else StringPool()
+        # Depth of the innermost open element
+        self._depth = 0
+        # Attributes and children of the type, command, feature or extension
+        # being built, and of the require or remove being built
+        self._obj = None
+        self._req = None
+        # Parts of the template being built
+        self._tpl = None
+        self._tpl_kind = None
+        self._tpl_tags = None
+        self._tpl_depth = 0
+        # Handlers to restore once the template is built
+        self._tpl_outer = None
+        # Texts of the first placeholder children of the template element
+        self._texts = None
+        # Depth of the placeholder element whose text is not part of the
+        # template, or 0
+        self._skip = 0
+        # Tag and text of the placeholder child being captured
+        self._capture_tag = None
+        self._capture = None
+        self._parser = xml.parsers.expat.ParserCreate()
+        self._parser.buffer_text = True
+        self._set_handlers(self._start_root, self._end_root)
+
+    def parse(self, data):
+        """Parses the whole registry XML contents `data`"""
+        self._parser.Parse(data, True)
+        return self.registry
+
+    def parse_file(self, f, chunk_size=1 << 16):
+        """Parses the registry XML contents of file `f`, which may be opened
+        in text or binary mode"""
+        parser = self._parser
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parser.Parse(chunk, False)
+        parser.Parse('', True)
+        return self.registry
+
+    def _set_handlers(self, start, end, data=None):
+        p = self._parser
+        p.StartElementHandler = start
+        p.EndElementHandler = end
+        p.CharacterDataHandler = data
+
+    def _start_root(self, tag, attrs):
+        self._depth += 1
+        if self._depth != 2:
+            return
+        if tag == 'types':
+            self._set_handlers(self._start_types, self._end_section)
+        elif tag == 'enums':
+            self._set_handlers(self._start_enums, self._end_section)
+        elif tag == 'commands':
+            self._set_handlers(self._start_commands, self._end_commands)
+        elif tag == 'feature':
+            self._obj = (attrs, [], [])
+            self._set_handlers(self._start_feature, self._end_feature)
+        elif tag == 'extensions':
+            self._set_handlers(self._start_extensions, self._end_extensions)
+
+    def _end_root(self, tag):
+        self._depth -= 1
+
+    def _end_section(self, tag):
+        if self._depth == 2:
+            self._set_handlers(self._start_root, self._end_root)
+        self._depth -= 1
+
+    def _start_types(self, tag, attrs):
+        self._depth += 1
+        if self._depth == 3 and tag == 'type':
+            self._obj = attrs
+            self._start_template('type')
+
+    def _start_enums(self, tag, attrs):
+        self._depth += 1
+        if self._depth == 3 and tag == 'enum':
+            pool = self._pool
+            x = Enum(pool(attrs['name']), pool(attrs['value']),
+                     attrs.get('comment'))
+            self.registry.enums[x.name] = x
+
+    def _start_commands(self, tag, attrs):
+        self._depth += 1
+        depth = self._depth
+        if depth == 3:
+            if tag == 'command':
+                self._obj = [attrs, None, None, None, []]
+        elif depth == 4 and self._obj is not None:
+            if tag == 'proto' and self._obj[1] is None:
+                self._start_template('proto')
+            elif tag == 'param':
+                self._start_template('param')
+
+    def _end_commands(self, tag):
+        depth = self._depth
+        if depth == 3 and self._obj is not None:
+            attrs, name, type, proto_template, params = self._obj
+            x = Command(self._pool(attrs.get('name') or name), type,
+                        proto_template, params, attrs.get('comment'))
+            self.registry.commands[x.name] = x
+            self._obj = None
+        elif depth == 2:
+            self._set_handlers(self._start_root, self._end_root)
+        self._depth -= 1
+
+    def _start_feature(self, tag, attrs):
+        self._depth += 1
+        depth = self._depth
+        if depth == 3:
+            if tag in ('require', 'remove'):
+                self._req = (attrs, [], [], [])
+        elif depth == 4 and self._req is not None:
+            self._add_require_item(tag, attrs)
+
+    def _end_feature(self, tag):
+        depth = self._depth
+        pool = self._pool
+        if depth == 3 and self._req is not None:
+            if tag == 'require':
+                self._obj[1].append(self._end_require())
+            else:
+                attrs, types, enums, commands = self._req
+                self._obj[2].append(Remove(types, enums, commands,
+                                           pool(attrs.get('profile')),
+                                           attrs.get('comment')))
+            self._req = None
+        elif depth == 2:
+            attrs, requires, removes = self._obj
+            x = Feature(pool(attrs['name']), pool(attrs['api']),
+                        tuple([int(y) for y in attrs['number'].split('.')]),
+                        requires, removes, attrs.get('comment'))
+            self.registry.features[x.name] = x
+            self._obj = None
+            self._set_handlers(self._start_root, self._end_root)
+        self._depth -= 1
+
+    def _start_extensions(self, tag, attrs):
+        self._depth += 1
+        depth = self._depth
+        if depth == 3:
+            if tag == 'extension':
+                self._obj = (attrs, [])
+        elif depth == 4:
+            if tag == 'require' and self._obj is not None:
+                self._req = (attrs, [], [], [])
+        elif depth == 5 and self._req is not None:
+            self._add_require_item(tag, attrs)
+
+    def _end_extensions(self, tag):
+        depth = self._depth
+        if depth == 4 and self._req is not None:
+            self._obj[1].append(self._end_require())
+            self._req = None
+        elif depth == 3 and self._obj is not None:
+            pool = self._pool
+            attrs, requires = self._obj
+            supported = set(pool(y) for y in attrs['supported'].split('|'))
+            x = Extension(pool(attrs['name']), supported, requires,
+                          attrs.get('comment'))
+            self.registry.extensions[x.name] = x
+            self._obj = None
+        elif depth == 2:
+            self._set_handlers(self._start_root, self._end_root)
+        self._depth -= 1
+
+    def _add_require_item(self, tag, attrs):
+        if tag == 'type':
+            self._req[1].append(self._pool(attrs['name']))
+        elif tag == 'enum':
+            self._req[2].append(self._pool(attrs['name']))
+        elif tag == 'command':
+            self._req[3].append(self._pool(attrs['name']))
+
+    def _end_require(self):
+        attrs, types, enums, commands = self._req
+        pool = self._pool
+        return Require(types, enums, commands, pool(attrs.get('profile')),
+                       pool(attrs.get('api')), attrs.get('comment'))
+
+    def _start_template(self, kind):
+        p = self._parser
+        self._tpl_outer = (p.StartElementHandler, p.EndElementHandler)
+        self._tpl = []
+        self._tpl_kind = kind
+        self._tpl_tags = self._placeholders[kind]
+        self._tpl_depth = self._depth
+        self._texts = {}
+        self._set_handlers(self._start_tpl, self._end_tpl, self._data_tpl)
+
+    def _end_capture(self):
+        self._texts[self._capture_tag] = ''.join(self._capture) or None
+        self._capture = None
+
+    def _start_tpl(self, tag, attrs):
+        self._depth += 1
+        if self._capture is not None:
+            self._end_capture()  # The text of an element ends at its child
+        if self._skip:
+            return
+        placeholder = self._tpl_tags.get(tag)
+        if placeholder is not None:
+            self._tpl.append(placeholder)
+            self._skip = self._depth
+            if (self._depth == self._tpl_depth + 1 and
+                    tag not in self._texts):
+                self._capture_tag = tag
+                self._capture = []
+
+    def _end_tpl(self, tag):
+        depth = self._depth
+        if self._skip == depth:
+            if self._capture is not None:
+                self._end_capture()
+            self._skip = 0
+        elif depth == self._tpl_depth:
+            self._end_template()
+            self._set_handlers(*self._tpl_outer)
+        self._depth -= 1
+
+    def _data_tpl(self, text):
+        if self._capture is not None:
+            self._capture.append(text)
+        if not self._skip:
+            self._tpl.append(text.replace('{', '{{').replace('}', '}}'))
+
+    def _end_template(self):
+        pool = self._pool
+        template = ''.join(self._tpl)
+        texts = self._texts
+        kind = self._tpl_kind
+        self._tpl = None
+        if kind == 'type':
+            attrs = self._obj
+            if 'requires' in attrs:
+                required_types = set((pool(attrs['requires']),))
+            else:
+                required_types = set()
+            x = Type(pool(attrs.get('name') or texts.get('name')), template,
+                     required_types, pool(attrs.get('api')),
+                     attrs.get('comment'))
+            self.registry.types[(x.name, x.api)] = x
+            self._obj = None
+        elif kind == 'proto':
+            self._obj[1] = texts.get('name')
+            self._obj[2] = pool(texts.get('ptype'))
+            self._obj[3] = pool(template)
+        else:
+            self._obj[4].append(Param(pool(texts.get('name')),
+                                      pool(texts.get('ptype')),
+                                      pool(template)))
+
+
+class RegistryFeeder(object):
+    """Builds a Registry incrementally from chunks of XML data
+
+    Types, enums, commands, features and extensions are built as soon as
+    their element has been fed, as with the `stream` argument of
+    :py:func:`load`. Requires :py:class:`xml.etree.ElementTree.XMLPullParser`
+    (Python 3.4 or later).
+
+    :param StringPool pool: Pool of strings to share with other registries,
+                            or None to use a new pool.
+    """
+
+    def __init__(self, pool=None):
+        self._parser = xml.etree.ElementTree.XMLPullParser(('start', 'end'))
+        self._loader = _StreamLoader(pool)
+
+    def feed(self, data):
+        """Parses a chunk of registry XML contents
+
+        :param bytes data: Next chunk of the registry XML contents
+        """
+        self._parser.feed(data)
+        self._loader.feed(self._parser.read_events())
+
+    def close(self):
+        """Finishes parsing the registry XML contents
+
+        :return: Registry
+        """
+        self._parser.close()
+        self._loader.feed(self._parser.read_events())
+        return self._loader.registry
+
+
+class _LazyOrderedDict(MutableMapping):
+    """Ordered mapping whose values are loaded from XML elements on first
+    access
+
+    Pickles and copies as an OrderedDict, loading every pending value first.
+    """
+
+    def __init__(self, load):
+        # Loads a value from an element. Not a lambda, so that a Registry
+        # holding this mapping can be pickled.
+        self._load = load
+        self._data = collections.OrderedDict()
+        self._elems = {}
+
+    def add_element(self, key, elem):
+        """Add `elem` to be loaded when `key` is looked up"""
+        self._data[key] = None
+        self._elems[key] = elem
+
+    def __getitem__(self, key):
+        elem = self._elems.get(key)
+        if elem is not None:
+            self._data[key] = self._load(elem)
+            del self._elems[key]  # Only once loading succeeded
+        return self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __setitem__(self, key, value):
+        self._elems.pop(key, None)
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+        self._elems.pop(key, None)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return repr(collections.OrderedDict(self.items()))
+
+    def __reduce__(self):
+        return collections.OrderedDict, (list(self.items()),)
+
+
+def _load_lazy_commands(elems, pool):
+    """Returns {name: Command} which loads Commands on first access"""
+    out = _LazyOrderedDict(functools.partial(_load_command, pool=pool))
+    for elem in elems:
+        name = pool(elem.get('name') or elem.find('proto/name').text)
+        out.add_element(name, elem)
+    return out
+
+
+def _load_elements(load, key=lambda x: x.name):
+    """Returns function loading {key: object} from a list of elements"""
+    def f(elems, pool):
+        out = collections.OrderedDict()
+        for elem in elems:
+            x = load(elem, pool)
+            out[key(x)] = x
+        return out
+    return f
+
+
+class _LazySection(object):
+    """Registry attribute which is loaded from its XML elements on first
+    access"""
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        value = self.load(obj._elements.pop(self.name), obj._pool)
+        obj.__dict__[self.name] = value
+        return value
+
+
+class _LazyRegistry(Registry):
+    """Registry which only loads its sections when they are first accessed.
+
+    Commands are additionally only loaded when they are looked up.
+    """
+
+    types = _LazySection('types', _load_elements(_load_type,
+                                                 lambda x: (x.name, x.api)))
+    enums = _LazySection('enums', _load_elements(_load_enum))
+    commands = _LazySection('commands', _load_lazy_commands)
+    features = _LazySection('features', _load_elements(_load_feature))
+    extensions = _LazySection('extensions', _load_elements(_load_extension))
+
+    def __init__(self, root, pool=None):
+        self.name = None
+        self._cache = {}
+        self._pool = pool if pool is not None else StringPool()
+        #: Mapping of section name to the XML elements of the section
+        self._elements = {'types': [], 'enums': [], 'commands': [],
+                          'features': [], 'extensions': []}
+        for elem in root:
+            if elem.tag == 'types':
+                self._elements['types'].extend(elem.findall('type'))
+            elif elem.tag == 'enums':
+                self._elements['enums'].extend(elem.findall('enum'))
+            elif elem.tag == 'commands':
+                self._elements['commands'].extend(elem.findall('command'))
+            elif elem.tag == 'feature':
+                self._elements['features'].append(elem)
+            elif elem.tag == 'extensions':
+                self._elements['extensions'].extend(
+                    elem.findall('extension'))
+
+
+def _check_backend(backend, lazy):
+    if backend not in ('etree', 'expat'):
+        raise ValueError('unknown backend: {0!r}'.format(backend))
+    if backend == 'expat' and lazy:
+        raise ValueError('the expat backend does not support lazy loading')
+
+
+def load(f, stream=False, lazy=False, pool=None, backend='etree'):
     """Loads Registry from file
 
     :param f: File to load
     :type f: File-like object
+    :param bool stream: If True, build the Registry incrementally while the
+                        file is being parsed, discarding each element once it
+                        has been loaded. This bounds peak memory usage to the
+                        Registry itself instead of the Registry plus the whole
+                        XML element tree.
+    :param bool lazy: If True, only load the types, enums, commands, features
+                      and extensions of the Registry when they are first
+                      accessed. Commands are only loaded when they are looked
+                      up. Cannot be combined with `stream`.
+    :param StringPool pool: Pool of strings to share with other registries,
+                            or None to use a new pool.
+    :param str backend: ``'etree'`` to load from ElementTree elements, or
+                        ``'expat'`` to build the Registry directly from the
+                        events of the expat parser, without creating any
+                        element. The expat backend always builds the Registry
+                        incrementally, and does not support `lazy`.
     :return: Registry
     """
-    return _load(xml.etree.ElementTree.parse(f))
-
-
-def loads(s):
+    _check_backend(backend, lazy)
+    if stream and lazy:
+        raise ValueError('stream and lazy loading are mutually exclusive')
+    if backend == 'expat':
+        with _phase('load_expat'):
+            return _ExpatLoader(pool).parse_file(f)
+    if stream:
+        with _phase('load_stream'):
+            return _iterload(f, pool)
+    with _phase('parse'):
+        tree = xml.etree.ElementTree.parse(f)
+    if lazy:
+        return _LazyRegistry(tree.getroot(), pool)
+    return _load(tree, pool)
+
+
+def loads(s, lazy=False, pool=None, backend='etree'):
     """Load registry from string
 
     :param s: Registry XML contents
     :type s: str or bytes
+    :param bool lazy: If True, only load the sections of the Registry when
+                      they are first accessed. See :func:`load`.
+    :param StringPool pool: Pool of strings to share with other registries,
+                            or None to use a new pool.
+    :param str backend: ``'etree'`` or ``'expat'``. See :func:`load`.
+    :return: Registry
+    """
+    _check_backend(backend, lazy)
+    if backend == 'expat':
+        with _phase('load_expat'):
+            return _ExpatLoader(pool).parse(s)
+    with _phase('parse'):
+        root = xml.etree.ElementTree.fromstring(s)
+    if lazy:
+        return _LazyRegistry(root, pool)
+    return _load(root, pool)
+
+
+# Number of bytes of a memory mapped file fed to the parser at once
+_MMAP_CHUNK_SIZE = 1 << 16
+
+
+def _load_mapping(m, lazy=False, pool=None):
+    """Load from the memory mapped file `m`, without copying it"""
+    if not hasattr(xml.etree.ElementTree, 'XMLPullParser'):  # Python < 3.4
+        return load(m, stream=not lazy, lazy=lazy, pool=pool)
+    view = memoryview(m)
+    try:
+        if lazy:
+            parser = xml.etree.ElementTree.XMLParser()
+        else:
+            parser = RegistryFeeder(pool)
+        with _phase('parse' if lazy else 'load_stream'):
+            for i in range(0, len(view), _MMAP_CHUNK_SIZE):
+                parser.feed(view[i:i + _MMAP_CHUNK_SIZE])
+            out = parser.close()
+    finally:
+        view.release()
+    return _LazyRegistry(out, pool) if lazy else out
+
+
+def load_path(path, lazy=False, pool=None):
+    """Loads Registry from the file at `path`
+
+    The file is memory mapped, and the parser reads the mapping directly.
+    Unless `lazy` is True, the Registry is built while the file is being
+    parsed, as with the `stream` argument of :py:func:`load`.
+
+    :param str path: Path of file to load
+    :param bool lazy: If True, only load the sections of the Registry when
+                      they are first accessed. See :func:`load`.
+    :param StringPool pool: Pool of strings to share with other registries,
+                            or None to use a new pool.
     :return: Registry
     """
-    return _load(xml.etree.ElementTree.fromstring(s))
+    with open(path, 'rb') as f:
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError):  # Empty or unmappable file
+            return load(f, stream=not lazy, lazy=lazy, pool=pool)
+        try:
+            return _load_mapping(m, lazy, pool)
+        finally:
+            m.close()
+
+
+# Bump whenever the pickled layout of the Registry object model changes
+_CACHE_VERSION = 5
+
+
+def _default_cache_dir():
+    base = (os.environ.get('XDG_CACHE_HOME') or
+            os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(base, 'glreg')
+
+
+def _loads_cached(data, cache_dir=None):
+    """Load registry from bytes `data`, using the cache in `cache_dir`"""
+    if cache_dir is None:
+        cache_dir = _default_cache_dir()
+    h = hashlib.sha1()
+    h.update('{0}:{1}:'.format(__version__, _CACHE_VERSION).encode('ascii'))
+    h.update(data)
+    path = os.path.join(cache_dir, h.hexdigest() + '.pickle')
+    try:
+        with open(path, 'rb') as f, _phase('load_cached'):
+            return pickle.load(f)
+    except Exception:
+        # Missing, unreadable or stale cache entry: parse the XML instead.
+        pass
+    registry = loads(data)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # Write to a temporary file first so that concurrent readers never
+        # see a partially written cache entry.
+        f = tempfile.NamedTemporaryFile('wb', dir=cache_dir, delete=False)
+    except (IOError, OSError):
+        return registry
+    try:
+        with f:
+            pickle.dump(registry, f, pickle.HIGHEST_PROTOCOL)
+        getattr(os, 'replace', os.rename)(f.name, path)
+    except Exception:
+        # Failing to write the cache must not fail the load, nor leave the
+        # temporary file behind.
+        try:
+            os.remove(f.name)
+        except OSError:
+            pass
+    return registry
+
+
+def load_cached(path, cache_dir=None):
+    """Loads Registry from file, reusing a previously parsed Registry if the
+    file has not changed.
+
+    Parsed registries are stored in `cache_dir`, keyed by a hash of the file
+    contents and the glreg version.
+
+    :param str path: Path of file to load
+    :param str cache_dir: Cache directory, or None to use
+                          ``$XDG_CACHE_HOME/glreg`` (``~/.cache/glreg``).
+    :return: Registry
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    return _loads_cached(data, cache_dir)
+
+
+def _symbol_count(reg):
+    """Returns the number of Types, Enums and Commands in `reg`"""
+    return len(reg.types) + len(reg.enums) + len(reg.commands)
 
 
 def _default_filter_symbol(t, name):
@@ -786,6 +2405,50 @@ def _default_filter_symbol(t, name):
     return True
 
 
+class _OnceFilter(object):
+    """Symbol filter which accepts every symbol only once"""
+
+    def __init__(self):
+        #: Set of accepted ``(symbol type, symbol name)`` tuples
+        self.symbols = set()
+
+    def __call__(self, t, name):
+        if _tracer is not None:
+            _tracer.count('filter_symbol')
+        k = (t, name)
+        if k in self.symbols:
+            return False
+        else:
+            self.symbols.add(k)
+            return True
+
+    def import_types(self, dest, src, names, api):
+        """Imports the Types `names` which have not been accepted yet, and
+        their dependencies which have not been accepted yet
+
+        Equivalent to :func:`import_type` with this filter, since once a Type
+        has been accepted, so have all its dependencies.
+        """
+        symbols = self.symbols
+        for name in names:
+            k = ('type', name)
+            if k not in symbols:
+                symbols.add(k)
+                self.import_closure(dest, src.get_type_closure(name, api))
+
+    def import_closure(self, dest, types):
+        """Imports the last Type of closure `types`, and the other Types of
+        the closure which have not been accepted yet"""
+        symbols = self.symbols
+        for x in types[:-1]:
+            k = ('type', x.name)
+            if k not in symbols:
+                symbols.add(k)
+                dest.types[(x.name, x.api)] = x
+        x = types[-1]
+        dest.types[(x.name, x.api)] = x
+
+
 def _default_filter_require(require):
     assert type(require) is Require
     return True
@@ -806,12 +2469,39 @@ def import_type(dest, src, name, api=None, filter_symbol=None):
     """
     if not filter_symbol:
         filter_symbol = _default_filter_symbol
-    type = src.get_type(name, api)
-    for x in type.required_types:
-        if not filter_symbol('type', x):
+    if _tracer is not None:
+        _tracer.count('import_type')
+        filter_symbol = _counted_filter(filter_symbol)
+    if filter_symbol is _default_filter_symbol:
+        for x in src.get_type_closure(name, api):
+            dest.types[(x.name, x.api)] = x
+        dest.clear_cache()
+        return
+    elif isinstance(filter_symbol, _OnceFilter):
+        filter_symbol.import_closure(dest, src.get_type_closure(name, api))
+        dest.clear_cache()
+        return
+    tree = src._get_type_tree(name, api)
+    # Accepted types which are imported once all their dependencies have
+    # been, as (index following the dependencies, Type) tuples
+    pending = []
+    i = 0
+    while i < len(tree):
+        x, type, end = tree[i]
+        while pending and pending[-1][0] <= i:
+            type2 = pending.pop()[1]
+            dest.types[(type2.name, type2.api)] = type2
+        if i and not filter_symbol('type', x):
+            i = end  # Skip dependencies of x
             continue
-        import_type(dest, src, x, api, filter_symbol)
-    dest.types[(type.name, type.api)] = type
+        if type is None:
+            src.get_type(x, api)  # Raises KeyError
+        pending.append((end, type))
+        i += 1
+    while pending:
+        type2 = pending.pop()[1]
+        dest.types[(type2.name, type2.api)] = type2
+    dest.clear_cache()
 
 
 def import_command(dest, src, name, api=None, filter_symbol=None):
@@ -829,12 +2519,23 @@ def import_command(dest, src, name, api=None, filter_symbol=None):
     """
     if not filter_symbol:
         filter_symbol = _default_filter_symbol
+    if _tracer is not None:
+        _tracer.count('import_command')
+        filter_symbol = _counted_filter(filter_symbol)
     cmd = src.commands[name]
-    for x in cmd.required_types:
-        if not filter_symbol('type', x):
-            continue
-        import_type(dest, src, x, api, filter_symbol)
+    if filter_symbol is _default_filter_symbol:
+        for x in src.get_command_types(name, api):
+            dest.types[(x.name, x.api)] = x
+    elif isinstance(filter_symbol, _OnceFilter):
+        filter_symbol.import_types(dest, src, src.get_command_type_names(name),
+                                   api)
+    else:
+        for x in sorted(cmd.required_types):
+            if not filter_symbol('type', x):
+                continue
+            import_type(dest, src, x, api, filter_symbol)
     dest.commands[name] = cmd
+    dest.clear_cache()
 
 
 def import_enum(dest, src, name):
@@ -845,6 +2546,7 @@ def import_enum(dest, src, name):
     :param str name: Name of Enum to import
     """
     dest.enums[name] = src.enums[name]
+    dest.clear_cache()
 
 
 def import_feature(dest, src, name, api=None, profile=None,
@@ -865,29 +2567,32 @@ def import_feature(dest, src, name, api=None, profile=None,
     """
     if filter_symbol is None:
         filter_symbol = _default_filter_symbol
+    filter_symbol = _counted_filter(filter_symbol)
     ft = src.features[name] if isinstance(name, str) else name
-    # Gather symbols to remove from Feature
-    remove_symbols = set()
-    for x in src.get_removes(api, profile):
-        remove_symbols.update(x.as_symbols())
+    remove_symbols = src.get_removed_symbols(api, profile)
 
     def my_filter_symbol(t, name):
         return False if (t, name) in remove_symbols else filter_symbol(t, name)
 
-    for req in ft.get_requires(profile):
-        for x in req.types:
-            if not my_filter_symbol('type', x):
-                continue
-            import_type(dest, src, x, api, filter_symbol)
-        for x in req.enums:
-            if not my_filter_symbol('enum', x):
-                continue
-            import_enum(dest, src, x)
-        for x in req.commands:
-            if not my_filter_symbol('command', x):
-                continue
-            import_command(dest, src, x, api, filter_symbol)
+    with _phase('import_feature', {'name': ft.name}) as phase:
+        n = _symbol_count(dest) if _tracer is not None else 0
+        for req in ft.get_requires(profile):
+            for x in req.types:
+                if not my_filter_symbol('type', x):
+                    continue
+                import_type(dest, src, x, api, filter_symbol)
+            for x in req.enums:
+                if not my_filter_symbol('enum', x):
+                    continue
+                import_enum(dest, src, x)
+            for x in req.commands:
+                if not my_filter_symbol('command', x):
+                    continue
+                import_command(dest, src, x, api, filter_symbol)
+        if _tracer is not None:
+            phase['symbols'] = _symbol_count(dest) - n
     dest.features[name] = ft
+    dest.clear_cache()
 
 
 def import_extension(dest, src, name, api=None, profile=None,
@@ -906,21 +2611,27 @@ def import_extension(dest, src, name, api=None, profile=None,
     """
     if filter_symbol is None:
         filter_symbol = _default_filter_symbol
+    filter_symbol = _counted_filter(filter_symbol)
     ext = src.extensions[name] if isinstance(name, str) else name
-    for req in ext.get_requires(api, profile):
-        for x in req.types:
-            if not filter_symbol('type', x):
-                continue
-            import_type(dest, src, x, api, filter_symbol)
-        for x in req.enums:
-            if not filter_symbol('enum', x):
-                continue
-            import_enum(dest, src, x)
-        for x in req.commands:
-            if not filter_symbol('command', x):
-                continue
-            import_command(dest, src, x, api, filter_symbol)
+    with _phase('import_extension', {'name': ext.name}) as phase:
+        n = _symbol_count(dest) if _tracer is not None else 0
+        for req in ext.get_requires(api, profile):
+            for x in req.types:
+                if not filter_symbol('type', x):
+                    continue
+                import_type(dest, src, x, api, filter_symbol)
+            for x in req.enums:
+                if not filter_symbol('enum', x):
+                    continue
+                import_enum(dest, src, x)
+            for x in req.commands:
+                if not filter_symbol('command', x):
+                    continue
+                import_command(dest, src, x, api, filter_symbol)
+        if _tracer is not None:
+            phase['symbols'] = _symbol_count(dest) - n
     dest.extensions[name] = ext
+    dest.clear_cache()
 
 
 def import_registry(dest, src, api=None, profile=None, support=None,
@@ -941,10 +2652,11 @@ def import_registry(dest, src, api=None, profile=None, support=None,
     """
     if filter_symbol is None:
         filter_symbol = _default_filter_symbol
-    for x in src.get_features(api):
-        import_feature(dest, src, x.name, api, profile, filter_symbol)
-    for x in src.get_extensions(support):
-        import_extension(dest, src, x.name, api, profile, filter_symbol)
+    with _phase('import_registry'):
+        for x in src.get_features(api):
+            import_feature(dest, src, x.name, api, profile, filter_symbol)
+        for x in src.get_extensions(support):
+            import_extension(dest, src, x.name, api, profile, filter_symbol)
 
 
 def extension_sort_key(extension):
@@ -960,6 +2672,33 @@ def extension_sort_key(extension):
     return (0, name) if category in ('ARB', 'KHR', 'OES') else (1, name)
 
 
+def iter_group_apis(reg, features=None, extensions=None, api=None,
+                    profile=None, support=None):
+    """Groups Types, Enums, Commands with their respective Features, Extensions
+
+    Same as :py:func:`group_apis`, but yields every Registry as soon as it has
+    been resolved instead of returning a list.
+
+    :returns: iterator of :py:class:`Registry` objects
+    """
+    features = (reg.get_features(api) if features is None
+                else [reg.features[x] for x in features])
+    if extensions is None:
+        extensions = sorted(reg.get_extensions(support),
+                            key=extension_sort_key)
+    else:
+        extensions = [reg.extensions[x] for x in extensions]
+    filter_symbol = _OnceFilter()
+    for x in features:
+        out = Registry(x.name)
+        import_feature(out, reg, x.name, api, profile, filter_symbol)
+        yield out
+    for x in extensions:
+        out = Registry(x.name)
+        import_extension(out, reg, x.name, api, profile, filter_symbol)
+        yield out
+
+
 def group_apis(reg, features=None, extensions=None, api=None, profile=None,
                support=None):
     """Groups Types, Enums, Commands with their respective Features, Extensions
@@ -980,33 +2719,479 @@ def group_apis(reg, features=None, extensions=None, api=None, profile=None,
                         support string, or None to import all.
     :returns: list of :py:class:`Registry` objects
     """
-    features = (reg.get_features(api) if features is None
-                else [reg.features[x] for x in features])
-    if extensions is None:
-        extensions = sorted(reg.get_extensions(support),
-                            key=extension_sort_key)
-    else:
-        extensions = [reg.extensions[x] for x in extensions]
-    output_symbols = set()
+    return list(iter_group_apis(reg, features, extensions, api, profile,
+                                support))
 
-    def filter_symbol(type, name):
-        k = (type, name)
-        if k in output_symbols:
-            return False
-        else:
-            output_symbols.add(k)
-            return True
 
-    out_apis = []
-    for x in features:
-        out = Registry(x.name)
-        import_feature(out, reg, x.name, api, profile, filter_symbol)
-        out_apis.append(out)
-    for x in extensions:
-        out = Registry(x.name)
-        import_extension(out, reg, x.name, api, profile, filter_symbol)
-        out_apis.append(out)
-    return out_apis
+def write_header(f, apis):
+    """Writes a C header of grouped APIs to a file
+
+    The declarations of every API are guarded by an ``#ifndef`` of the API
+    name. Each line is written as soon as it has been formatted, so `apis`
+    may be an iterator such as the one returned by
+    :py:func:`iter_group_apis`.
+
+    :param f: File to write to
+    :param apis: Iterable of :py:class:`Registry` objects
+    """
+    for api in apis:
+        with _phase('write_header', {'name': api.name}):
+            f.write('#ifndef {0}\n#define {0}\n'.format(api.name))
+            empty = True
+            for line in api.iter_text():
+                f.write(line)
+                f.write('\n')
+                empty = False
+            if empty:
+                f.write('\n')
+            f.write('#endif\n\n')
+
+
+def _hash_name(name, seed):
+    """Returns the 32-bit hash of `name` with `seed`, as computed by the C
+    function written by :py:func:`write_loader`"""
+    h = (2166136261 ^ seed) & 0xFFFFFFFF
+    for c in bytearray(name.encode('ascii')):
+        h = ((h ^ c) * 16777619) & 0xFFFFFFFF
+    h ^= h >> 16
+    h = (h * 0x85EBCA6B) & 0xFFFFFFFF
+    h ^= h >> 13
+    h = (h * 0xC2B2AE35) & 0xFFFFFFFF
+    return h ^ (h >> 16)
+
+
+def _perfect_hash(names):
+    """Computes a hash and displace perfect hash of `names`
+
+    Names are placed in buckets by their hash with seed 0. Then, starting
+    with the largest bucket, the smallest seed which maps the names of the
+    bucket to distinct free slots is searched for. Names alone in their
+    bucket are placed in the remaining free slots directly.
+
+    :return: ``(seeds, slots)`` tuple, where `seeds` is a list of the seed of
+             every bucket and `slots` is the list of names in slot order. A
+             negative seed ``-i - 1`` means that the name of the bucket is in
+             slot ``i``.
+    """
+    n = len(names)
+    buckets = [[] for i in range((n + 1) // 2)]
+    for x in names:
+        buckets[_hash_name(x, 0) % len(buckets)].append(x)
+    seeds = [0] * len(buckets)
+    slots = [None] * n
+    free = None
+    for i in sorted(range(len(buckets)), key=lambda i: -len(buckets[i])):
+        bucket = buckets[i]
+        if not bucket:
+            break
+        elif len(bucket) == 1:
+            if free is None:
+                free = (p for p, x in enumerate(slots) if x is None)
+            p = next(free)
+            seeds[i] = -p - 1
+            slots[p] = bucket[0]
+            continue
+        seed = 1
+        while True:
+            pos = [_hash_name(x, seed) % n for x in bucket]
+            if (len(set(pos)) == len(pos) and
+                    all(slots[p] is None for p in pos)):
+                break
+            seed += 1
+        seeds[i] = seed
+        for x, p in zip(bucket, pos):
+            slots[p] = x
+    return seeds, slots
+
+
+_loader_template = r'''/* Generated by glreg {version} */
+#include <stddef.h>
+#include <string.h>
+#ifndef APIENTRY
+#define APIENTRY
+#endif
+#ifndef APIENTRYP
+#define APIENTRYP APIENTRY *
+#endif
+
+#define {PREFIX}_NUM_COMMANDS {n}
+#define {PREFIX}_NUM_BUCKETS {m}
+
+{typedefs}
+
+/* Function pointers of every command, in perfect hash slot order */
+struct {prefix}_dispatch {{
+{members}
+}};
+
+typedef void (*{prefix}_proc)(void);
+typedef {prefix}_proc (*{prefix}_get_proc_address)(const char *name);
+
+static const char *const {prefix}_names[{n}] = {{
+{names}
+}};
+
+static const unsigned int {prefix}_offsets[{n}] = {{
+{offsets}
+}};
+
+static const long {prefix}_seeds[{m}] = {{
+{seeds}
+}};
+
+static unsigned long {prefix}_hash(const char *s, unsigned long seed)
+{{
+    unsigned long h = (2166136261UL ^ seed) & 0xFFFFFFFFUL;
+    for (; *s; s++)
+        h = ((h ^ (unsigned char)*s) * 16777619UL) & 0xFFFFFFFFUL;
+    h ^= h >> 16;
+    h = (h * 0x85EBCA6BUL) & 0xFFFFFFFFUL;
+    h ^= h >> 13;
+    h = (h * 0xC2B2AE35UL) & 0xFFFFFFFFUL;
+    return h ^ (h >> 16);
+}}
+
+/* Returns the slot of command `name`, or -1 if there is no such command */
+static int {prefix}_slot(const char *name)
+{{
+    long seed = {prefix}_seeds[{prefix}_hash(name, 0) % {m}];
+    unsigned long slot = seed < 0 ? (unsigned long)(-seed - 1)
+                                  : {prefix}_hash(name, seed) % {n};
+    return strcmp({prefix}_names[slot], name) ? -1 : (int)slot;
+}}
+
+/* Fills `d` with the address of every command returned by `get`, and
+ * returns the number of commands which were found */
+static int {prefix}_load(struct {prefix}_dispatch *d,
+                         {prefix}_get_proc_address get)
+{{
+    int i, found = 0;
+    for (i = 0; i < {n}; i++) {{
+        {prefix}_proc p = get({prefix}_names[i]);
+        memcpy((char *)d + {prefix}_offsets[i], &p, sizeof(p));
+        found += p != NULL;
+    }}
+    return found;
+}}
+
+/* Returns the address of command `name` in `d`, or NULL */
+static {prefix}_proc {prefix}_lookup(const struct {prefix}_dispatch *d,
+                                     const char *name)
+{{
+    {prefix}_proc p;
+    int slot = {prefix}_slot(name);
+    if (slot < 0)
+        return NULL;
+    memcpy(&p, (const char *)d + {prefix}_offsets[slot], sizeof(p));
+    return p;
+}}
+'''
+
+
+def write_loader(f, registry, prefix='glreg'):
+    """Writes a C loader of the Commands of a Registry to a file
+
+    The loader defines a ``PFN<NAME>PROC`` function pointer type for every
+    Command, and:
+
+    * ``struct <prefix>_dispatch``, with a function pointer member named
+      after every Command
+    * ``int <prefix>_load(struct <prefix>_dispatch *d,
+      <prefix>_get_proc_address get)``, which fills `d` with the addresses
+      returned by the user supplied ``get(name)`` function, and returns the
+      number of addresses found
+    * ``<prefix>_proc <prefix>_lookup(const struct <prefix>_dispatch *d, const
+      char *name)``, which returns the address of Command `name` in `d`
+    * ``int <prefix>_slot(const char *name)``, which returns the index of
+      Command `name` in a compile-time perfect hash table, or -1
+
+    All functions are ``static``. The types used by the Commands must be
+    declared before the loader, for example by a header written by
+    :py:func:`write_header` for the same Registry.
+
+    :param f: File to write to
+    :param Registry registry: Registry, usually resolved with
+                              :py:func:`import_registry`
+    :param str prefix: Prefix of the names of the loader's types and
+                       functions
+    """
+    if not registry.commands:
+        raise ValueError('registry has no commands')
+    seeds, slots = _perfect_hash(list(registry.commands))
+    typedefs = []
+    for x in registry.commands.values():
+        pfn = 'PFN{0}PROC'.format(x.name.upper())
+        params = ', '.join(y.text for y in x.params) or 'void'
+        typedefs.append('typedef {0}({1});'.format(
+            _render(x.proto_template, type=x.type,
+                    name='(APIENTRYP {0})'.format(pfn)), params))
+    f.write(_loader_template.format(
+        version=__version__, prefix=prefix, PREFIX=prefix.upper(),
+        n=len(slots), m=len(seeds), typedefs='\n'.join(typedefs),
+        members='\n'.join('    PFN{0}PROC {1};'.format(x.upper(), x)
+                          for x in slots),
+        names='\n'.join('    "{0}",'.format(x) for x in slots),
+        offsets='\n'.join('    offsetof(struct {0}_dispatch, {1}),'
+                          .format(prefix, x) for x in slots),
+        seeds='\n'.join('    {0}L,'.format(x) for x in seeds)))
+
+
+_enum_table_template = r'''/* Generated by glreg {version} */
+#include <stddef.h>
+
+#define {PREFIX}_NUM_ENUM_VALUES {n}
+
+/* Preferred name of every enum value, sorted by value */
+static const struct {{
+    unsigned long value;
+    const char *name;
+}} {prefix}_enum_names[{n}] = {{
+{entries}
+}};
+
+/* Returns the preferred name of enum value `value`, or NULL */
+static const char *{prefix}_enum_name(unsigned long value)
+{{
+    size_t lo = 0, hi = {n};
+    while (lo < hi) {{
+        size_t mid = lo + (hi - lo) / 2;
+        if ({prefix}_enum_names[mid].value < value)
+            lo = mid + 1;
+        else
+            hi = mid;
+    }}
+    if (lo < {n} && {prefix}_enum_names[lo].value == value)
+        return {prefix}_enum_names[lo].name;
+    return NULL;
+}}
+'''
+
+
+def get_enum_table(registry):
+    """Returns the preferred name of every 32-bit unsigned enum value of a
+    Registry
+
+    When several Enums have the same value, the Enum introduced by the
+    earliest Feature is preferred, then Enums which are not introduced by
+    any Feature, in registry order.
+
+    :param Registry registry: Registry
+    :return: list of ``(value, name)`` tuples, sorted by value
+    """
+    features = dict((x, i) for i, x in enumerate(registry.features))
+    out = {}
+    for i, x in enumerate(registry.enums.values()):
+        value = x.int_value
+        if value is None or not 0 <= value <= 0xFFFFFFFF:
+            continue
+        ft = registry.get_introducing_feature('enum', x.name)
+        k = (0, features[ft.name], i) if ft else (1, 0, i)
+        if value not in out or k < out[value][0]:
+            out[value] = (k, x.name)
+    return [(k, out[k][1]) for k in sorted(out)]
+
+
+def write_enum_table(f, registry, prefix='glreg'):
+    """Writes a C table of the names of the enum values of a Registry to a
+    file
+
+    The table defines ``const char *<prefix>_enum_name(unsigned long
+    value)``, a ``static`` function which returns the preferred name of an
+    enum value by binary search, or NULL if no Enum has the value. Names are
+    preferred as in :py:func:`get_enum_table`.
+
+    :param f: File to write to
+    :param Registry registry: Registry, usually resolved with
+                              :py:func:`import_registry`
+    :param str prefix: Prefix of the names of the table and function
+    """
+    table = get_enum_table(registry)
+    if not table:
+        raise ValueError('registry has no enum values')
+    f.write(_enum_table_template.format(
+        version=__version__, prefix=prefix, PREFIX=prefix.upper(),
+        n=len(table), entries='\n'.join(
+            '    {{0x{0:08X}UL, "{1}"}},'.format(k, x) for k, x in table)))
+
+
+def _generate_header(registry, api=None, profile=None, support=None):
+    f = StringIO()
+    write_header(f, iter_group_apis(registry, None, None, api, profile,
+                                    support))
+    return f.getvalue()
+
+
+# Registry of generate_headers() worker processes
+_worker_registry = None
+
+
+def _init_worker(registry):
+    global _worker_registry
+    _worker_registry = registry
+
+
+def _generate_worker_header(target):
+    return _generate_header(_worker_registry, *target)
+
+
+def generate_headers(registry, targets, processes=None):
+    """Generates C headers for several targets from one Registry
+
+    The headers are generated in parallel by a pool of worker processes. Each
+    header is identical to the output of the command line interface for the
+    same api, profile and support arguments.
+
+    :param Registry registry: Source Registry
+    :param targets: Targets to generate headers for
+    :type targets: Iterable of ``(api, profile, support)`` tuples, where each
+                   item may be None as in :py:func:`group_apis`.
+    :param int processes: Number of worker processes, or None to use the
+                          number of CPUs. If 1, headers are generated in the
+                          calling process.
+    :returns: list of header strings, in the order of `targets`
+    """
+    targets = [tuple(x) for x in targets]
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(targets))
+    if processes <= 1:
+        return [_generate_header(registry, *x) for x in targets]
+    # Phases of worker processes are not traced
+    pool = multiprocessing.Pool(processes, _init_worker, (registry,))
+    try:
+        with _phase('generate_headers', {'processes': processes}):
+            return pool.map(_generate_worker_header, targets, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _load_manifest(path):
+    """Returns list of ``(output path, (api, profile, support))`` from the
+    JSON manifest at `path`. Output paths are relative to the directory of the
+    manifest."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        entries = json.load(f)
+    out = []
+    for x in entries:
+        if not isinstance(x, dict) or 'output' not in x:
+            raise ValueError('manifest entry without output: {0!r}'.format(x))
+        unknown = set(x) - set(('output', 'api', 'profile', 'support'))
+        if unknown:
+            raise ValueError('unknown manifest keys: {0}'.format(
+                             ', '.join(sorted(unknown))))
+        path = os.path.join(base_dir, x['output'])
+        out.append((path, (x.get('api'), x.get('profile'), x.get('support'))))
+    return out
+
+
+def _content_key(x):
+    """Returns hashable description of the contents of a registry object"""
+    if isinstance(x, Type):
+        return (x.name, x.template, tuple(sorted(x.required_types)), x.api,
+                x.comment)
+    elif isinstance(x, Enum):
+        return (x.name, x.value, x.comment)
+    elif isinstance(x, Command):
+        return (x.name, x.type, x.proto_template,
+                tuple((y.name, y.type, y.template) for y in x.params),
+                x.comment)
+    elif isinstance(x, Feature):
+        return (x.name, x.api, x.number,
+                tuple(_content_key(y) for y in x.requires),
+                tuple(_content_key(y) for y in x.removes), x.comment)
+    elif isinstance(x, Extension):
+        return (x.name, tuple(sorted(x.supported)),
+                tuple(_content_key(y) for y in x.requires), x.comment)
+    elif isinstance(x, Require):
+        return (tuple(x.types), tuple(x.enums), tuple(x.commands), x.profile,
+                x.api, x.comment)
+    elif isinstance(x, Remove):
+        return (tuple(x.types), tuple(x.enums), tuple(x.commands), x.profile,
+                x.comment)
+    raise TypeError('unsupported object: {0!r}'.format(x))
+
+
+class SectionDiff(object):
+    """Differences between the same section of two registries
+
+    """
+
+    def __init__(self, added=None, removed=None, changed=None):
+        #: List of keys which are only in the new section
+        self.added = list(added or ())
+        #: List of keys which are only in the old section
+        self.removed = list(removed or ())
+        #: List of keys whose objects differ between the sections
+        self.changed = list(changed or ())
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return _repr(self, (self.added, self.removed, self.changed))
+
+
+class RegistryDiff(object):
+    """Differences between two registries
+
+    """
+
+    def __init__(self, types, enums, commands, features, extensions):
+        #: `SectionDiff` of `Registry.types`
+        self.types = types
+        #: `SectionDiff` of `Registry.enums`
+        self.enums = enums
+        #: `SectionDiff` of `Registry.commands`
+        self.commands = commands
+        #: `SectionDiff` of `Registry.features`
+        self.features = features
+        #: `SectionDiff` of `Registry.extensions`
+        self.extensions = extensions
+
+    def __bool__(self):
+        return any((self.types, self.enums, self.commands, self.features,
+                    self.extensions))
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return _repr(self, (self.types, self.enums, self.commands,
+                            self.features, self.extensions))
+
+
+def _diff_section(old, new):
+    old_keys = dict((k, _content_key(x)) for k, x in old.items())
+    out = SectionDiff()
+    for k, x in new.items():
+        old_key = old_keys.pop(k, None)
+        if old_key is None:
+            out.added.append(k)
+        elif old_key != _content_key(x):
+            out.changed.append(k)
+    out.removed.extend(k for k in old if k in old_keys)
+    return out
+
+
+def diff(old, new):
+    """Compares the types, enums, commands, features and extensions of two
+    registries.
+
+    Objects are matched by their key in each section, and compared by
+    their contents.
+
+    :param Registry old: Old registry
+    :param Registry new: New registry
+    :return: :py:class:`RegistryDiff`
+    """
+    return RegistryDiff(_diff_section(old.types, new.types),
+                        _diff_section(old.enums, new.enums),
+                        _diff_section(old.commands, new.commands),
+                        _diff_section(old.features, new.features),
+                        _diff_section(old.extensions, new.extensions))
 
 
 def main(args=None, prog=None):
@@ -1024,6 +3209,8 @@ def main(args=None, prog=None):
     p.add_argument('--profile', help='Match profile', default=None)
     p.add_argument('--support', default=None,
                    help='Match extension support string')
+    p.add_argument('--cache-dir', metavar='DIR', dest='cache_dir',
+                   default=None, help='Cache parsed registries in DIR')
     g = p.add_mutually_exclusive_group()
     g.add_argument('--list-apis', action='store_true', dest='list_apis',
                    help='List apis in registry', default=False)
@@ -1032,13 +3219,74 @@ def main(args=None, prog=None):
     g.add_argument('--list-supports', action='store_true',
                    dest='list_supports', default=False,
                    help='List extension support strings')
-    p.add_argument('registry', type=argparse.FileType('rb'), nargs='?',
-                   default=stdin, help='Registry path')
+    g.add_argument('--diff', metavar='OLD', default=None,
+                   help='List differences between OLD and registry')
+    g.add_argument('--manifest', metavar='MANIFEST', default=None,
+                   help='Generate every header listed in MANIFEST')
+    g.add_argument('--loader', action='store_true', default=False,
+                   help='Generate a C loader of the commands instead of a '
+                        'header')
+    g.add_argument('--enum-table', action='store_true', dest='enum_table',
+                   default=False,
+                   help='Generate a C table of enum names instead of a '
+                        'header')
+    p.add_argument('-j', '--jobs', metavar='N', type=int, default=1,
+                   help='Generate up to N manifest headers in parallel')
+    p.add_argument('--trace-out', metavar='PATH', dest='trace_out',
+                   default=None,
+                   help='Write a Chrome trace of the run to PATH')
+    p.add_argument('registry', nargs='?', default='-',
+                   help='Registry path (default: standard input)')
     args = p.parse_args(args)
     o = args.output
+
+    def load_arg(path):
+        if path == '-':
+            if args.cache_dir:
+                return _loads_cached(stdin.read(), args.cache_dir)
+            return load(stdin)
+        if args.cache_dir:
+            return load_cached(path, args.cache_dir)
+        if args.trace_out:
+            # Parse before loading, so that the trace has a phase for the
+            # parse and for each section
+            with open(path, 'rb') as f:
+                return load(f)
+        return load_path(path)
+    tracer = None
+    if args.trace_out:
+        tracer = Tracer()
+        previous_tracer = set_tracer(tracer)
     try:
-        registry = load(args.registry)
-        if args.list_apis:
+        registry = load_arg(args.registry)
+        if args.manifest:
+            outputs = _load_manifest(args.manifest)
+            headers = generate_headers(registry, [x[1] for x in outputs],
+                                       args.jobs)
+            for (path, _), header in zip(outputs, headers):
+                with open(path, 'w') as f:
+                    f.write(header)
+            return 0
+        elif args.diff:
+            delta = diff(load_arg(args.diff), registry)
+            for t in ('type', 'enum', 'command', 'feature', 'extension'):
+                section = getattr(delta, t + 's')
+                for c, keys in (('+', section.added), ('-', section.removed),
+                                ('~', section.changed)):
+                    for k in keys:
+                        if isinstance(k, tuple):  # Type key
+                            k = '{0} ({1})'.format(*k) if k[1] else k[0]
+                        print(c, t, k, file=o)
+            return 0
+        elif args.loader:
+            write_loader(o, registry.select(args.api, args.profile,
+                                            args.support))
+            return 0
+        elif args.enum_table:
+            write_enum_table(o, registry.select(args.api, args.profile,
+                                                args.support))
+            return 0
+        elif args.list_apis:
             for x in sorted(registry.get_apis()):
                 print(x, file=o)
             return 0
@@ -1050,18 +3298,18 @@ def main(args=None, prog=None):
             for x in sorted(registry.get_supports()):
                 print(x, file=o)
             return 0
-        apis = group_apis(registry, None, None, args.api, args.profile,
-                          args.support)
-        for api in apis:
-            print('#ifndef', api.name, file=o)
-            print('#define', api.name, file=o)
-            print(api.text, file=o)
-            print('#endif', file=o)
-            print('', file=o)
+        apis = iter_group_apis(registry, None, None, args.api, args.profile,
+                               args.support)
+        write_header(o, apis)
     except:
         e = sys.exc_info()[1]
         print(prog, ': error: ', e, sep='', file=sys.stderr)
         return 1
+    finally:
+        if tracer is not None:
+            set_tracer(previous_tracer)
+            with open(args.trace_out, 'w') as f:
+                tracer.write_chrome_trace(f)
     return 0
 
 
@@ -0,0 +1,42 @@
+"""asyncio support for glreg
+
+Loads registries in an asyncio event loop, without blocking it for the whole
+duration of the parsing. Requires Python 3.5 or later.
+"""
+import asyncio
+import glreg
+
+__all__ = ['load_async']
+
+
+async def load_async(stream, pool=None, chunk_size=65536):
+    """Loads Registry from an asynchronous stream
+
+    The registry is built incrementally with :py:class:`glreg.RegistryFeeder`
+    as chunks arrive. Chunks are parsed `chunk_size` bytes at a time, and
+    control is yielded to the event loop after each of them.
+
+    :param stream: Stream to read the registry XML contents from
+    :type stream: Object with a ``read(n)`` coroutine method such as
+                  :py:class:`asyncio.StreamReader`, or asynchronous iterable
+                  of bytes chunks
+    :param StringPool pool: Pool of strings to share with other registries,
+                            or None to use a new pool.
+    :param int chunk_size: Maximum number of bytes parsed at once
+    :return: Registry
+    """
+    feeder = glreg.RegistryFeeder(pool)
+    if hasattr(stream, 'read'):
+        while True:
+            data = await stream.read(chunk_size)
+            if not data:
+                break
+            feeder.feed(data)
+            await asyncio.sleep(0)
+    else:
+        async for data in stream:
+            data = memoryview(data)
+            for i in range(0, len(data), chunk_size):
+                feeder.feed(data[i:i + chunk_size])
+                await asyncio.sleep(0)
+    return feeder.close()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python
+"""glreg benchmarks
+
+Run ``python glreg_bench.py --help`` for usage. Benchmarks run either on a
+registry file given on the command line, or on deterministic synthetic
+registries of roughly the size of gl.xml, or multiples thereof.
+"""
+from __future__ import print_function
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+import xml.etree.ElementTree
+import glreg
+
+#: Approximate section sizes of gl.xml
+GL_XML_SIZES = dict(types=120, enums=7000, commands=3300, params=3,
+                    features=40, extensions=600, type_depth=2)
+
+
+def scaled_sizes(scale):
+    """Returns `GL_XML_SIZES` with the number of types, enums, commands,
+    features and extensions multiplied by `scale`
+
+    :param float scale: Scale factor
+    :return: dict of `make_registry_xml` keyword arguments
+    """
+    out = dict(GL_XML_SIZES)
+    for k in ('types', 'enums', 'commands', 'features', 'extensions'):
+        out[k] = max(1, int(round(out[k] * scale)))
+    return out
+
+
+def make_registry_xml(types=120, enums=7000, commands=3300, params=3,
+                      features=40, extensions=600, type_depth=2, seed=0):
+    """Returns the XML text of a deterministic synthetic registry
+
+    :param int types: Number of types
+    :param int enums: Number of enums
+    :param int commands: Number of commands
+    :param int params: Number of params per command
+    :param int features: Number of features
+    :param int extensions: Number of extensions
+    :param int type_depth: Length of type dependency chains. Types form
+                           chains of `type_depth` types where each type
+                           requires the previous type in its chain.
+    :param int seed: Random seed
+    :return: str
+    """
+    rnd = random.Random(seed)
+    type_names = ['GLtype{0}'.format(i) for i in range(types)]
+    enum_names = ['GL_ENUM_{0}'.format(i) for i in range(enums)]
+    command_names = ['glCommand{0}'.format(i) for i in range(commands)]
+    out = ['<?xml version="1.0" encoding="UTF-8"?>', '<registry>', '<types>']
+    for i, name in enumerate(type_names):
+        if type_depth > 1 and i % type_depth:
+            out.append('<type requires="{0}">typedef {0} <name>{1}</name>;'
+                       '</type>'.format(type_names[i - 1], name))
+        else:
+            out.append('<type>typedef unsigned int <name>{0}</name>;</type>'
+                       .format(name))
+    out.append('</types>')
+    out.append('<enums namespace="GL">')
+    for i, name in enumerate(enum_names):
+        out.append('<enum value="0x{0:04X}" name="{1}"/>'.format(i, name))
+    out.append('</enums>')
+    out.append('<commands namespace="GL">')
+    for name in command_names:
+        out.append('<command>')
+        out.append('<proto>void <name>{0}</name></proto>'.format(name))
+        for i in range(params):
+            out.append('<param><ptype>{0}</ptype> <name>p{1}</name></param>'
+                       .format(rnd.choice(type_names), i))
+        out.append('</command>')
+    out.append('</commands>')
+
+    def require(rnd_names, n):
+        return ''.join('<{0} name="{1}"/>'.format(tag, rnd.choice(names))
+                       for tag, names in rnd_names for i in range(n))
+
+    def chunk(names, i, n):
+        k = (len(names) + n - 1) // n
+        return names[i * k:(i + 1) * k]
+
+    for i in range(features):
+        out.append('<feature api="gl" name="GL_VERSION_{0}_0" number="{0}.0">'
+                   .format(i + 1))
+        out.append('<require>')
+        for tag, names in (('type', type_names), ('enum', enum_names),
+                           ('command', command_names)):
+            for name in chunk(names, i, features + 1):
+                out.append('<{0} name="{1}"/>'.format(tag, name))
+        out.append('</require>')
+        if i:
+            out.append('<remove profile="core">')
+            out.append(require((('command', command_names),), 2))
+            out.append('</remove>')
+        out.append('</feature>')
+    out.append('<extensions>')
+    for i in range(extensions):
+        out.append('<extension name="GL_EXT_extension{0}" supported="{1}">'
+                   .format(i, rnd.choice(('gl', 'gl|glcore'))))
+        out.append('<require>')
+        out.append(require((('enum', enum_names),
+                            ('command', command_names)), 3))
+        out.append('</require>')
+        out.append('</extension>')
+    out.append('</extensions>')
+    out.append('</registry>')
+    return '\n'.join(out)
+
+
+def _registry_objects(registry):
+    """Yields every Type, Enum, Command, Param, Feature, Extension, Require
+    and Remove object in `registry`"""
+    for x in registry.types.values():
+        yield x
+    for x in registry.enums.values():
+        yield x
+    for x in registry.commands.values():
+        yield x
+        for y in x.params:
+            yield y
+    for x in registry.features.values():
+        yield x
+        for y in x.requires:
+            yield y
+        for y in x.removes:
+            yield y
+    for x in registry.extensions.values():
+        yield x
+        for y in x.requires:
+            yield y
+
+
+class _DictObject(object):
+    """Object with a per-instance ``__dict__``, for comparison with slotted
+    glreg objects"""
+
+    def __init__(self, obj):
+        for k in type(obj).__slots__:
+            setattr(self, k, getattr(obj, k))
+
+
+def bench_memory(xml):
+    """Measures the memory used by the objects of a registry, and by
+    equivalent objects with a per-instance ``__dict__``.
+
+    :return: dict
+    """
+    import tracemalloc
+    registry = glreg.loads(xml)
+    objects = list(_registry_objects(registry))
+    gc.collect()
+    tracemalloc.start()
+    copies = [type(x).__new__(type(x)) for x in objects]
+    for x, y in zip(objects, copies):
+        for k in type(x).__slots__:
+            setattr(y, k, getattr(x, k))
+    slotted = tracemalloc.get_traced_memory()[0]
+    del copies
+    gc.collect()
+    tracemalloc.stop()
+    tracemalloc.start()
+    copies = [_DictObject(x) for x in objects]
+    unslotted = tracemalloc.get_traced_memory()[0]
+    del copies
+    tracemalloc.stop()
+    return dict(objects=len(objects), slotted_bytes=slotted,
+                dict_bytes=unslotted)
+
+
+def _best_time(f, repeat):
+    """Returns the best wall time of `repeat` calls of `f`, and the result of
+    the last call"""
+    best = None
+    for i in range(repeat):
+        gc.collect()
+        start = timeit.default_timer()
+        result = f()
+        t = timeit.default_timer() - start
+        best = t if best is None else min(best, t)
+    return best, result
+
+
+def bench_phases(data, repeat=3):
+    """Times the loading, importing, grouping and rendering phases on a
+    registry
+
+    :param data: Registry XML contents
+    :param int repeat: Number of runs of each phase. The best time is kept.
+    :return: dict mapping phase names to seconds
+    """
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    out = {}
+    out['loads'], registry = _best_time(lambda: glreg.loads(data), repeat)
+    out['load'], _ = _best_time(lambda: glreg.load(io.BytesIO(data)), repeat)
+    out['load_stream'], _ = _best_time(
+        lambda: glreg.load(io.BytesIO(data), stream=True), repeat)
+    out['load_expat'], _ = _best_time(
+        lambda: glreg.load(io.BytesIO(data), backend='expat'), repeat)
+    f = tempfile.NamedTemporaryFile('wb', suffix='.xml', delete=False)
+    try:
+        with f:
+            f.write(data)
+        out['load_path'], _ = _best_time(lambda: glreg.load_path(f.name),
+                                         repeat)
+    finally:
+        os.remove(f.name)
+    out['parse'], root = _best_time(
+        lambda: xml.etree.ElementTree.fromstring(data), repeat)
+    for phase in ('types', 'enums', 'commands', 'features', 'extensions'):
+        f = getattr(glreg, '_load_' + phase)
+        out['_load_' + phase], _ = _best_time(lambda: f(root), repeat)
+    out['import_registry'], _ = _best_time(
+        lambda: glreg.import_registry(glreg.Registry(), registry), repeat)
+    out['resolve'], _ = _best_time(
+        lambda: glreg.SymbolIndex(registry).resolve('gl', 'core', 'glcore'),
+        repeat)
+    out['group_apis'], apis = _best_time(
+        lambda: glreg.group_apis(registry, api='gl', profile='core',
+                                 support='glcore'), repeat)
+
+    def render():
+        f = io.StringIO() if sys.version_info > (3, 0) else io.BytesIO()
+        glreg.write_header(f, apis)
+        return f
+    # The first rendering of a registry differs from later ones, as rendered
+    # text is cached on the registry objects.
+    registry = glreg.loads(data)
+    apis = glreg.group_apis(registry, api='gl', profile='core',
+                            support='glcore')
+    out['render_cold'], _ = _best_time(render, 1)
+    out['render'], _ = _best_time(render, repeat)
+    return out
+
+
+def _load_sweeps(root, pool):
+    """Loads a registry with one ``findall`` sweep per section, three per
+    ``<require>`` and ``<remove>`` element and path lookups in each
+    ``<command>``, as glreg did before it loaded registries in a single pass.
+    Baseline of `bench_load_dispatch`."""
+    def proto_text(t):
+        if t.tag == 'name':
+            return '{name}'
+        elif t.tag == 'ptype':
+            return '{type}'
+        out = [glreg._escape_tpl_str(t.text)] if t.text else []
+        for x in t:
+            out.append(proto_text(x))
+            if x.tail:
+                out.append(glreg._escape_tpl_str(x.tail))
+        return ''.join(out)
+
+    def command(elem):
+        type_elem = elem.find('proto/ptype')
+        return glreg.Command(
+            pool(elem.get('name') or elem.find('proto/name').text),
+            pool(type_elem.text) if type_elem is not None else None,
+            pool(proto_text(elem.find('proto'))),
+            [glreg._load_param(x, pool) for x in elem.findall('param')],
+            elem.get('comment'))
+
+    def names(elem):
+        return [[pool(x.attrib['name']) for x in elem.findall(tag)]
+                for tag in ('type', 'enum', 'command')]
+
+    def require(elem):
+        return glreg.Require(*names(elem) + [pool(elem.get('profile')),
+                                            pool(elem.get('api')),
+                                            elem.get('comment')])
+
+    def remove(elem):
+        return glreg.Remove(*names(elem) + [pool(elem.get('profile')),
+                                           elem.get('comment')])
+    reg = glreg.Registry()
+    for elem in root.findall('types/type'):
+        x = glreg._load_type(elem, pool)
+        reg.types[(x.name, x.api)] = x
+    for elem in root.findall('enums/enum'):
+        x = glreg._load_enum(elem, pool)
+        reg.enums[x.name] = x
+    for elem in root.findall('commands/command'):
+        x = command(elem)
+        reg.commands[x.name] = x
+    for elem in root.findall('feature'):
+        x = glreg.Feature(
+            pool(elem.attrib['name']), pool(elem.attrib['api']),
+            tuple([int(y) for y in elem.attrib['number'].split('.')]),
+            [require(y) for y in elem.findall('require')],
+            [remove(y) for y in elem.findall('remove')], elem.get('comment'))
+        reg.features[x.name] = x
+    for elem in root.findall('extensions/extension'):
+        x = glreg.Extension(
+            pool(elem.attrib['name']),
+            set(pool(y) for y in elem.attrib['supported'].split('|')),
+            [require(y) for y in elem.findall('require')], elem.get('comment'))
+        reg.extensions[x.name] = x
+    return reg
+
+
+def bench_load_dispatch(data, repeat=10):
+    """Times loading a parsed registry in a single pass over its sections,
+    against one ``findall`` sweep per section and per require child tag, and
+    path lookups in each command.
+
+    Runs of both loaders are interleaved, so that both see the same machine
+    load.
+
+    :param data: Registry XML contents
+    :param int repeat: Number of runs of each loader. The best time is kept.
+    :return: dict mapping loader names to seconds, and the speedup of the
+             single pass
+    """
+    root = xml.etree.ElementTree.fromstring(data)
+    loaders = (('sweeps', lambda: _load_sweeps(root, glreg.StringPool())),
+               ('single_pass', lambda: glreg._load(root)))
+    out = {}
+    for i in range(repeat):
+        for name, f in loaders:
+            t, _ = _best_time(f, 1)
+            out[name] = min(out.get(name, t), t)
+    out['speedup'] = out['sweeps'] / out['single_pass']
+    return out
+
+
+def bench_scaling(scales, repeat=3, seed=0):
+    """Runs `bench_phases` on synthetic registries of several sizes
+
+    :param scales: Sizes of registries, relative to gl.xml
+    :type scales: Iterable of floats
+    :param int repeat: Number of runs of each phase
+    :param int seed: Random seed of the synthetic registries
+    :return: dict of results, suitable for serializing as JSON
+    """
+    results = []
+    for scale in scales:
+        sizes = scaled_sizes(scale)
+        xml = make_registry_xml(seed=seed, **sizes)
+        results.append(dict(scale=scale, sizes=sizes,
+                            timings=bench_phases(xml, repeat)))
+    # Time per unit of scale, relative to the smallest registry. Values
+    # growing with the scale reveal superlinear behavior.
+    base = results[0]
+    for x in results:
+        x['relative'] = dict(
+            (k, (v / x['scale']) / (base['timings'][k] / base['scale']))
+            for k, v in x['timings'].items() if base['timings'][k] > 0)
+    return dict(glreg_version=glreg.__version__,
+                python_version=platform.python_version(),
+                implementation=platform.python_implementation(),
+                repeat=repeat, seed=seed, results=results)
+
+
+def main(args=None):
+    p = argparse.ArgumentParser(description='glreg benchmarks')
+    sub = p.add_subparsers(dest='benchmark')
+    sub.required = True
+    m = sub.add_parser('memory', help='Memory used by registry objects')
+    m.add_argument('registry', nargs='?', default=None,
+                   help='Registry path (default: synthetic gl.xml-sized '
+                        'registry)')
+    s = sub.add_parser('scaling',
+                       help='Phase timings on growing synthetic registries')
+    s.add_argument('--scales', metavar='SCALE', type=float, nargs='+',
+                   default=[1, 2, 5, 10],
+                   help='Registry sizes relative to gl.xml')
+    s.add_argument('--repeat', metavar='N', type=int, default=3,
+                   help='Keep the best time of N runs of each phase')
+    s.add_argument('--seed', type=int, default=0, help='Random seed')
+    s.add_argument('-o', '--output', metavar='PATH',
+                   type=argparse.FileType('w'), default=sys.stdout,
+                   help='Write JSON results to PATH')
+    d = sub.add_parser('dispatch',
+                       help='Single pass section loading against one sweep '
+                            'per section')
+    d.add_argument('registry', nargs='?', default=None,
+                   help='Registry path (default: synthetic gl.xml-sized '
+                        'registry)')
+    d.add_argument('--repeat', metavar='N', type=int, default=10,
+                   help='Keep the best time of N runs of each loader')
+    args = p.parse_args(args)
+    if args.benchmark == 'scaling':
+        r = bench_scaling(args.scales, args.repeat, args.seed)
+        json.dump(r, args.output, indent=2, sort_keys=True)
+        args.output.write('\n')
+        return 0
+    if args.registry:
+        with open(args.registry, 'rb') as f:
+            xml = f.read()
+    else:
+        xml = make_registry_xml(**GL_XML_SIZES)
+    if args.benchmark == 'dispatch':
+        r = bench_load_dispatch(xml, args.repeat)
+        print('sweeps:      {0:.4f}s'.format(r['sweeps']))
+        print('single pass: {0:.4f}s'.format(r['single_pass']))
+        print('speedup:     {0:.2f}x'.format(r['speedup']))
+        return 0
+    r = bench_memory(xml)
+    print('objects:         {0}'.format(r['objects']))
+    print('__slots__ bytes: {0}'.format(r['slotted_bytes']))
+    print('__dict__ bytes:  {0}'.format(r['dict_bytes']))
+    print('saving:          {0:.1%}'.format(
+          1 - float(r['slotted_bytes']) / r['dict_bytes']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
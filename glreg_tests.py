@@ -1,11 +1,25 @@
 import collections
+import copy
+import gc
 import sys
 import xml.etree.ElementTree
 import unittest
 import io
+import json
+import os
+import pickle
+import shutil
+import subprocess
 import tempfile
+import warnings
 import glreg
+import glreg_bench
 from glreg import *
+try:
+    import asyncio
+    import glreg_async
+except (ImportError, SyntaxError):  # Python < 3.5
+    glreg_async = None
 
 _test_reg = r'''<?xml version="1.0" encoding="UTF-8" ?>
     <registry>
@@ -223,6 +237,46 @@ class TestLoadFunctions(unittest.TestCase):
         self.test_load_features(registry.features)
         self.test_load_extensions(registry.extensions)
 
+    def test_load_section_order(self):
+        registry = loads(r'''<registry>
+            <extensions>
+                <extension name="GL_EXT_a" supported="gl">
+                    <require><enum name="B"/><type name="T"/>
+                        <enum name="A"/></require>
+                </extension>
+            </extensions>
+            <feature api="gl" name="GL_VERSION_1_0" number="1.0">
+                <remove><command name="glA"/></remove>
+                <require><command name="glA"/></require>
+            </feature>
+            <groups><group name="G"/></groups>
+            <enums><enum name="A" value="1"/></enums>
+            <feature api="gl" name="GL_VERSION_1_1" number="1.1"/>
+            <enums><unused start="2"/><enum name="B" value="2"/></enums>
+        </registry>''')
+        self.assertEqual(list(registry.enums), ['A', 'B'])
+        self.assertEqual(list(registry.features),
+                         ['GL_VERSION_1_0', 'GL_VERSION_1_1'])
+        feature = registry.features['GL_VERSION_1_0']
+        self.assertEqual(feature.requires[0].commands, ['glA'])
+        self.assertEqual(feature.removes[0].commands, ['glA'])
+        require = registry.extensions['GL_EXT_a'].requires[0]
+        self.assertEqual(require.enums, ['B', 'A'])
+        self.assertEqual(require.types, ['T'])
+
+    def test_load_stream(self):
+        if sys.version_info > (3, 0):
+            f = io.StringIO(_test_reg)
+        else:
+            f = io.BytesIO(_test_reg)
+        registry = load(f, stream=True)
+        self.test_load_types(registry.types)
+        self.test_load_enums(registry.enums)
+        self.test_load_commands(registry.commands)
+        self.test_load_features(registry.features)
+        self.test_load_extensions(registry.extensions)
+        self.assertEqual(repr(registry), repr(loads(_test_reg)))
+
     def test_loads(self):
         registry = loads(_test_reg)
         self.test_load_types(registry.types)
@@ -232,6 +286,371 @@ class TestLoadFunctions(unittest.TestCase):
         self.test_load_extensions(registry.extensions)
 
 
+class TestLoadPath(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'gl.xml')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def test_load_path(self):
+        data = glreg_bench.make_registry_xml(
+            types=20, enums=500, commands=100, features=2,
+            extensions=10).encode('utf-8')
+        self.write(data)
+        expected = repr(loads(data))
+        self.assertEqual(repr(glreg.load_path(self.path)), expected)
+        self.assertEqual(repr(glreg.load_path(self.path, lazy=True)),
+                         '_Lazy' + expected)
+
+    def test_load_path_chunks(self):
+        self.write(_test_reg.encode('utf-8'))
+        chunk_size = glreg._MMAP_CHUNK_SIZE
+        glreg._MMAP_CHUNK_SIZE = 16
+        try:
+            registry = glreg.load_path(self.path)
+        finally:
+            glreg._MMAP_CHUNK_SIZE = chunk_size
+        self.assertEqual(repr(registry), repr(loads(_test_reg)))
+
+    def test_load_path_empty(self):
+        self.write(b'')
+        self.assertRaises(xml.etree.ElementTree.ParseError, glreg.load_path,
+                          self.path)
+
+
+class TestLoadLazy(unittest.TestCase):
+    def test_loads_lazy(self):
+        registry = loads(_test_reg, lazy=True)
+        self.assertIsInstance(registry, Registry)
+        self.assertEqual(repr(registry), '_Lazy' + repr(loads(_test_reg)))
+
+    def test_lazy_sections(self):
+        registry = loads(_test_reg, lazy=True)
+        self.assertNotIn('commands', vars(registry))
+        commands = registry.commands
+        self.assertIs(registry.commands, commands)
+        self.assertEqual(list(commands), ['glBufferData'])
+        self.assertIn('glBufferData', commands._elems)
+        self.assertIn('glBufferData', commands)
+        self.assertNotIn('glFoo', commands)
+        self.assertIn('glBufferData', commands._elems)
+        x = commands['glBufferData']
+        self.assertIsInstance(x, Command)
+        self.assertEqual(x.params[1].type, 'GLsizeiptr')
+        self.assertIs(commands['glBufferData'], x)
+        self.assertNotIn('glBufferData', commands._elems)
+        self.assertNotIn('types', vars(registry))
+
+    def test_lazy_load_error(self):
+        registry = loads(r'''<registry><commands><command>
+            <proto>void <name>glA</name></proto><param>int</param>
+            </command></commands></registry>''', lazy=True)
+        for i in range(2):
+            self.assertRaises(AttributeError, registry.commands.__getitem__,
+                              'glA')
+        self.assertIn('glA', registry.commands._elems)
+
+    def test_lazy_pickle(self):
+        registry = loads(_test_reg, lazy=True)
+        self.assertIn('glBufferData', registry.commands._elems)
+        expected = repr(loads(_test_reg))
+        x = pickle.loads(pickle.dumps(registry, 2))
+        self.assertEqual(repr(x), '_Lazy' + expected)
+        self.assertIsInstance(x.commands, collections.OrderedDict)
+        self.assertEqual(repr(copy.deepcopy(registry)), '_Lazy' + expected)
+
+    def test_lazy_import_registry(self):
+        src = loads(_test_reg, lazy=True)
+        dst = Registry()
+        import_registry(dst, src, 'gl', 'core')
+        expected = Registry()
+        import_registry(expected, loads(_test_reg), 'gl', 'core')
+        self.assertEqual(repr(dst), repr(expected))
+
+    def test_load_stream_lazy(self):
+        f = io.BytesIO(_test_reg.encode('utf-8'))
+        self.assertRaises(ValueError, load, f, stream=True, lazy=True)
+
+
+class TestLoadExpat(unittest.TestCase):
+    _templates_reg = r'''<?xml version="1.0" encoding="UTF-8" ?>
+<registry>
+    <types>
+        <type name="brace">#define X {0} <!-- comment --> }}</type>
+        <type api="gles2">typedef <b>int <i>x</i></b> <name>A<c/>B</name>
+            tail;</type>
+        <type requires="A"><name>C</name><name>D</name>
+            typedef void (<apientry/> *<name>C</name>)(A);</type>
+    </types>
+    <commands>
+        <command comment="x">
+            <proto group="g">const <ptype>A</ptype> *<name>glF</name></proto>
+            <param len="4"><ptype>C</ptype> {<name>p</name>}</param>
+            <param>void *<name>q</name></param>
+            <alias name="glG"/>
+        </command>
+        <command name="glH"><proto>void <name>glI</name></proto></command>
+    </commands>
+</registry>
+'''
+
+    def test_loads(self):
+        self.assertEqual(repr(loads(_test_reg, backend='expat')),
+                         repr(loads(_test_reg)))
+
+    def test_load(self):
+        f = io.BytesIO(_test_reg.encode('utf-8'))
+        registry = load(f, backend='expat')
+        self.assertEqual(repr(registry), repr(loads(_test_reg)))
+
+    def test_load_text(self):
+        if sys.version_info > (3, 0):
+            f = io.StringIO(_test_reg)
+        else:
+            f = io.BytesIO(_test_reg)
+        registry = load(f, backend='expat')
+        self.assertEqual(repr(registry), repr(loads(_test_reg)))
+
+    def test_load_chunks(self):
+        f = io.BytesIO(_test_reg.encode('utf-8'))
+        registry = glreg._ExpatLoader().parse_file(f, chunk_size=7)
+        self.assertEqual(repr(registry), repr(loads(_test_reg)))
+
+    def test_load_synthetic(self):
+        data = glreg_bench.make_registry_xml(
+            types=30, enums=500, commands=100, features=3, extensions=20,
+            type_depth=3)
+        self.assertEqual(repr(loads(data, backend='expat')),
+                         repr(loads(data)))
+
+    def test_load_templates(self):
+        registry = loads(self._templates_reg, backend='expat')
+        self.assertEqual(repr(registry), repr(loads(self._templates_reg)))
+        self.assertEqual(registry.types[('brace', None)].text,
+                         '#define X {0}  }}')
+        self.assertEqual(registry.commands['glF'].params[0].text,
+                         'C {p}')
+
+    def test_pool(self):
+        pool = StringPool()
+        a = loads(_test_reg, backend='expat', pool=pool)
+        b = loads(_test_reg, pool=pool)
+        self.assertIs(a.commands['glBufferData'].name,
+                      b.commands['glBufferData'].name)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, loads, _test_reg, backend='sax')
+        self.assertRaises(ValueError, loads, _test_reg, lazy=True,
+                          backend='expat')
+
+
+@unittest.skipIf(not hasattr(xml.etree.ElementTree, 'XMLPullParser'),
+                 'XMLPullParser is not available')
+class TestRegistryFeeder(unittest.TestCase):
+    def test_feed(self):
+        data = _test_reg.encode('utf-8')
+        feeder = RegistryFeeder()
+        for i in range(0, len(data), 7):
+            feeder.feed(data[i:i + 7])
+        self.assertEqual(repr(feeder.close()), repr(loads(_test_reg)))
+
+
+class _Chunks(object):
+    """Asynchronous iterable of chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        for x in self.chunks:
+            return asyncio.sleep(0, x)
+        raise StopAsyncIteration
+
+
+@unittest.skipIf(glreg_async is None, 'asyncio is not available')
+class TestLoadAsync(unittest.TestCase):
+    def setUp(self):
+        self.data = glreg_bench.make_registry_xml(
+            types=20, enums=500, commands=100, features=2,
+            extensions=10).encode('utf-8')
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def load(self, stream, **kwargs):
+        """Returns the number of event loop iterations while loading"""
+        ticks = [0]
+
+        def tick():
+            ticks[0] += 1
+            handle[0] = self.loop.call_soon(tick)
+        handle = [self.loop.call_soon(tick)]
+        registry = self.loop.run_until_complete(
+            glreg_async.load_async(stream, **kwargs))
+        handle[0].cancel()
+        self.assertEqual(repr(registry), repr(loads(self.data)))
+        return ticks[0]
+
+    def test_load_async_iterable(self):
+        ticks = self.load(_Chunks([self.data[:1000], self.data[1000:]]),
+                          chunk_size=4096)
+        self.assertGreater(ticks, len(self.data) // 4096)
+
+    def test_load_async_reader(self):
+        reader = asyncio.StreamReader(loop=self.loop)
+        reader.feed_data(self.data)
+        reader.feed_eof()
+        self.assertGreater(self.load(reader, chunk_size=4096), 1)
+
+
+class TestStringPool(unittest.TestCase):
+    def test_pool(self):
+        pool = StringPool()
+        registry = loads(_test_reg, pool=pool)
+        self.assertGreater(pool.deduplicated, 0)
+        cmd_name = next(iter(registry.commands))
+        ext = registry.extensions['GL_ARB_vertex_buffer_object']
+        self.assertIs(ext.requires[0].commands[0], cmd_name)
+        params = registry.commands['glBufferData'].params
+        self.assertIs(params[0].type, params[3].type)
+        self.assertIs(params[0].template, params[1].template)
+
+    def test_shared_pool(self):
+        pool = StringPool()
+        reg1 = loads(_test_reg, pool=pool)
+        n = len(pool)
+        reg2 = loads(_test_reg, lazy=True, pool=pool)
+        self.assertEqual(len(pool), n)
+        self.assertIs(next(iter(reg1.commands)), next(iter(reg2.commands)))
+
+
+class TestLoadCached(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.fin = tempfile.NamedTemporaryFile('w', suffix='.xml')
+        self.fin.write(_test_reg)
+        self.fin.flush()
+
+    def tearDown(self):
+        self.fin.close()
+        shutil.rmtree(self.cache_dir)
+
+    def test_load_cached(self):
+        registry = load_cached(self.fin.name, self.cache_dir)
+        self.assertEqual(repr(registry), repr(loads(_test_reg)))
+        entries = os.listdir(self.cache_dir)
+        self.assertEqual(len(entries), 1)
+        # Subsequent loads come from the cache entry
+        path = os.path.join(self.cache_dir, entries[0])
+        with open(path, 'wb') as f:
+            pickle.dump(Registry('cached'), f)
+        registry = load_cached(self.fin.name, self.cache_dir)
+        self.assertEqual(registry.name, 'cached')
+
+    def test_load_cached_corrupt(self):
+        load_cached(self.fin.name, self.cache_dir)
+        path = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(path, 'wb') as f:
+            f.write(b'garbage')
+        registry = load_cached(self.fin.name, self.cache_dir)
+        self.assertEqual(repr(registry), repr(loads(_test_reg)))
+
+    def test_load_cached_write_error(self):
+        def dump(obj, f, protocol=None):
+            f.write(b'partial')
+            raise pickle.PicklingError('unpicklable')
+        pickle_dump = pickle.dump
+        pickle.dump = dump
+        try:
+            registry = load_cached(self.fin.name, self.cache_dir)
+        finally:
+            pickle.dump = pickle_dump
+        self.assertEqual(repr(registry), repr(loads(_test_reg)))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+
+class TestObjects(unittest.TestCase):
+    def test_slots(self):
+        registry = loads(_test_reg)
+        objects = [registry.types[('GLenum', None)],
+                   registry.enums['GL_POINTS'],
+                   registry.commands['glBufferData'],
+                   registry.commands['glBufferData'].params[0],
+                   registry.features['GL_VERSION_3_2'],
+                   registry.features['GL_VERSION_3_2'].requires[0],
+                   registry.features['GL_VERSION_3_2'].removes[0],
+                   registry.extensions['GL_ARB_vertex_buffer_object']]
+        for x in objects:
+            self.assertFalse(hasattr(x, '__dict__'), type(x).__name__)
+        self.assertEqual(repr(pickle.loads(pickle.dumps(registry, 2))),
+                         repr(registry))
+
+    def test_enum_int_value(self):
+        for value, expected in (('0x806F', 0x806F), ('0', 0), ('42', 42),
+                                ('-1', -1), ('0xFFFFFFFFu', 0xFFFFFFFF),
+                                ('0xFFFFFFFFFFFFFFFFull', 2 ** 64 - 1),
+                                ('010', 8), ('0777', 511), ('08', None),
+                                ('5u', 5), ('5lu', 5), ('5LLU', 5),
+                                ('5lul', None), ('5lL', None), ('- 1', None),
+                                ('((GLuint)1)', None), ('GL_POINTS', None)):
+            self.assertEqual(Enum('GL_X', value).int_value, expected, value)
+        x = Enum('GL_X', '1')
+        x.value = '0x10'
+        self.assertEqual(x.int_value, 16)
+        self.assertEqual(pickle.loads(pickle.dumps(x, 2)).int_value, 16)
+        x.value = 5
+        self.assertEqual(x.value, 5)
+        self.assertEqual(x.int_value, 5)
+
+
+class TestTemplates(unittest.TestCase):
+    def test_render(self):
+        for tpl in ('typedef signed char {name}; {{}}', '{type} {name}',
+                    'const void *{name}', '', '{{name}}', '{name!r}',
+                    '{name:>8}'):
+            self.assertEqual(glreg._render(tpl, name='x', type=None),
+                             tpl.format(name='x', type=None))
+        self.assertRaises(KeyError, glreg._render, '{type}', name='x')
+
+    def test_compiled_templates_bounded(self):
+        for i in range(glreg._MAX_COMPILED_TEMPLATES + 10):
+            self.assertEqual(glreg._render('{name}' + str(i), name='x'),
+                             'x' + str(i))
+        self.assertLessEqual(len(glreg._compiled_templates),
+                             glreg._MAX_COMPILED_TEMPLATES)
+
+    def test_text_cache(self):
+        registry = loads(_test_reg)
+        t = registry.types[('GLbyte', None)]
+        self.assertEqual(t.text, 'typedef signed char GLbyte; {}')
+        self.assertIs(t.text, t.text)
+        t.name = 'GLchar'
+        self.assertEqual(t.text, 'typedef signed char GLchar; {}')
+        t.template = 'typedef char {name};'
+        self.assertEqual(t.text, 'typedef char GLchar;')
+        cmd = registry.commands['glBufferData']
+        self.assertEqual(cmd.text, 'void glBufferData (GLenum target, '
+                         'GLsizeiptr size, const void *data, GLenum usage)')
+        cmd.name = 'glBufferDataARB'
+        cmd.params[0].type = 'GLuint'
+        cmd.params[1].name = 'length'
+        self.assertEqual(cmd.text, 'void glBufferDataARB (GLuint target, '
+                         'GLsizeiptr length, const void *data, GLenum usage)')
+        cmd.proto_template = '{type} {name}'
+        cmd.type = 'GLint'
+        self.assertEqual(cmd.proto_text, 'GLint glBufferDataARB')
+
+
 class TestRegistry(unittest.TestCase):
     """Test Registy interface"""
 
@@ -251,6 +670,167 @@ class TestRegistry(unittest.TestCase):
         # are active.
         self.assertEqual(len(removes), 0)
 
+    def test_get_removed_symbols(self):
+        removed = self.src.get_removed_symbols('gl', 'core')
+        self.assertEqual(removed, {('command', 'glNewList'),
+                                   ('command', 'glEndList'),
+                                   ('enum', 'GL_POINT_BIT'),
+                                   ('command', 'glArrayElement')})
+        self.assertIs(self.src.get_removed_symbols('gl', 'core'), removed)
+        self.assertEqual(self.src.get_removed_symbols('gl'), set())
+        self.assertEqual(self.src.get_removed_symbols('gles2', 'core'),
+                         set())
+
+    def test_get_requiring(self):
+        feature = self.src.features['GL_VERSION_3_2']
+        ext = self.src.extensions['GL_ARB_vertex_buffer_object']
+        self.assertEqual(self.src.get_requiring('command', 'glBufferData'),
+                         [feature, ext])
+        self.assertEqual(self.src.get_requiring('enum', 'GL_POINTS'),
+                         [feature])
+        self.assertEqual(self.src.get_requiring('type', 'GLenum'), [])
+
+    def test_get_introducing_feature(self):
+        feature = self.src.features['GL_VERSION_3_2']
+        self.assertIs(self.src.get_introducing_feature('command',
+                                                       'glBufferData'),
+                      feature)
+        self.assertIs(self.src.get_introducing_feature('type', 'GLbyte',
+                                                       'gl'), feature)
+        self.assertIsNone(self.src.get_introducing_feature('type', 'GLbyte',
+                                                           'gles2'))
+
+    def test_get_dependents(self):
+        types = self.src.get_dependent_types('khrplatform')
+        self.assertEqual(types, [self.src.types[('GLbyte', 'gles2')]])
+        self.assertEqual(self.src.get_dependent_commands('khrplatform'), [])
+        cmd = self.src.commands['glBufferData']
+        self.assertEqual(self.src.get_dependent_commands('GLsizeiptr'),
+                         [cmd])
+        self.assertEqual(self.src.get_dependent_types('GLsizeiptr'), [])
+
+    def test_get_type_closure(self):
+        types = self.src.types
+        self.assertEqual(self.src.get_type_closure('GLsizeiptr'),
+                         (types[('stddef', None)],
+                          types[('GLsizeiptr', None)]))
+        self.assertEqual(self.src.get_type_closure('GLbyte', 'gles2'),
+                         (types[('khrplatform', None)],
+                          types[('GLbyte', 'gles2')]))
+        self.assertIs(self.src.get_type_closure('GLbyte', 'gles2'),
+                      self.src.get_type_closure('GLbyte', 'gles2'))
+        self.assertRaises(KeyError, self.src.get_type_closure, 'GLint')
+
+    def test_get_command_types(self):
+        types = self.src.types
+        self.assertEqual(self.src.get_command_types('glBufferData'),
+                         (types[('GLenum', None)], types[('stddef', None)],
+                          types[('GLsizeiptr', None)]))
+        group_apis(self.src)
+        types = self.src.get_command_types('glBufferData')
+        group_apis(self.src, api='gl')
+        self.assertIs(self.src.get_command_types('glBufferData'), types)
+
+    def test_get_type_closure_cycle(self):
+        reg = Registry()
+        for name, deps in (('a', ['b', 'c']), ('b', ['a']), ('c', ['b'])):
+            reg.types[(name, None)] = Type(name, name, deps)
+        self.assertEqual([x.name for x in reg.get_type_closure('a')],
+                         ['b', 'c', 'a'])
+
+    def test_select(self):
+        view = self.src.select('gl', 'core')
+        self.assertIsInstance(view, Registry)
+        self.assertEqual(list(view.features), ['GL_VERSION_3_2'])
+        self.assertIs(view.enums['GL_POINTS'], self.src.enums['GL_POINTS'])
+        self.assertEqual(list(view.types), [('stddef', None),
+                                            ('GLenum', None),
+                                            ('GLbyte', None),
+                                            ('GLsizeiptr', None)])
+        self.assertNotIn(('GLbyte', 'gles2'), view.types)
+        self.assertRaises(KeyError, lambda: view.types[('GLbyte', 'gles2')])
+        with self.assertRaises(TypeError):
+            view.enums['GL_X'] = None
+        view = self.src.select('gles2', support='gles2')
+        self.assertEqual(len(view.types), 0)
+        view = self.src.select('gl', 'core')
+        self.assertEqual(repr(group_apis(view)), repr(group_apis(self.src)))
+
+    def test_select_clear_cache(self):
+        view = self.src.select('gl', 'core')
+        self.assertNotIn('GL_X', view.enums)
+        self.src.enums['GL_X'] = Enum('GL_X', '1')
+        self.src.features['GL_VERSION_3_2'].requires[0].enums.append('GL_X')
+        view.clear_cache()
+        self.assertIs(view.enums['GL_X'], self.src.enums['GL_X'])
+
+    def test_select_synthetic(self):
+        reg = loads(glreg_bench.make_registry_xml(
+            types=40, enums=200, commands=100, features=4, extensions=30,
+            type_depth=3))
+        for args in (('gl', 'core', 'glcore'), ('gl', None, 'gl'),
+                     (None, None, None)):
+            dst = Registry()
+            import_registry(dst, reg, *args)
+            view = reg.select(*args)
+            for k in ('types', 'enums', 'commands', 'features',
+                      'extensions'):
+                self.assertEqual(set(getattr(view, k)),
+                                 set(getattr(dst, k)), k)
+                self.assertEqual(len(getattr(view, k)),
+                                 len(getattr(dst, k)), k)
+
+    def test_get_enum_names(self):
+        self.assertEqual(self.src.get_enum_names(0x806F), ('GL_TEXTURE_3D',))
+        self.assertEqual(self.src.get_enum_names(0x1234), ())
+        self.src.enums['GL_POINTS_ALIAS'] = Enum('GL_POINTS_ALIAS', '0u')
+        self.src.clear_cache()
+        self.assertEqual(self.src.get_enum_names(0),
+                         ('GL_POINTS', 'GL_POINTS_ALIAS'))
+
+    def test_symbol_index(self):
+        index = self.src.get_symbol_index()
+        self.assertIs(self.src.get_symbol_index(), index)
+        self.assertEqual(index.symbols[:3], [('type', 'stddef'),
+                                             ('type', 'khrplatform'),
+                                             ('type', 'GLenum')])
+        self.assertEqual(index.get_id('enum', 'GL_POINTS'), 5)
+        ft = index.get_feature_bits('GL_VERSION_3_2')
+        self.assertEqual(index.count(ft), 4)
+        self.assertEqual(index.decode(ft & index.get_extension_bits(
+            'GL_ARB_vertex_buffer_object')), [('command', 'glBufferData')])
+        core = index.resolve('gl', 'core')
+        self.assertEqual(index.decode(core), index.decode(ft))
+        removed = index.get_remove_bits('gl', 'core')
+        self.assertEqual(set(index.decode(removed)),
+                         self.src.get_removed_symbols('gl', 'core'))
+        self.assertEqual(index.resolve(extensions=[]), ft)
+
+    def test_symbol_index_resolve(self):
+        reg = loads(glreg_bench.make_registry_xml(
+            types=40, enums=200, commands=100, features=4, extensions=30))
+        index = reg.get_symbol_index()
+        for args in (('gl', 'core', 'glcore'), ('gl', None, 'gl'),
+                     (None, None, None)):
+            dst = Registry()
+            import_registry(dst, reg, *args)
+            symbols = set(index.decode(index.resolve(*args)))
+            self.assertEqual(set(x[1] for x in symbols if x[0] == 'enum'),
+                             set(dst.enums))
+            self.assertEqual(set(x[1] for x in symbols if x[0] == 'command'),
+                             set(dst.commands))
+
+    def test_clear_cache(self):
+        feature = self.src.features['GL_VERSION_3_2']
+        dst = Registry()
+        import_feature(dst, self.src, feature.name, 'gl', 'core')
+        self.assertIn('GL_POINTS', dst.enums)
+        feature.removes.append(Remove([], ['GL_POINTS'], [], 'core'))
+        self.src.clear_cache()
+        dst = Registry()
+        import_feature(dst, self.src, feature.name, 'gl', 'core')
+        self.assertNotIn('GL_POINTS', dst.enums)
+
     def test_get_profiles(self):
         profiles = self.src.get_profiles()
         self.assertIsInstance(profiles, set)
@@ -284,6 +864,37 @@ class TestImportFunctions(unittest.TestCase):
         _, x = items[1]
         self.assertIs(x, stypes[('GLbyte', 'gles2')])
 
+    def test_import_type_filter(self):
+        reg = Registry()
+        for name, deps in (('a', ['b', 'c']), ('b', ['d']), ('c', ['d']),
+                           ('d', [])):
+            reg.types[(name, None)] = Type(name, name, deps)
+        calls = []
+
+        def filter_symbol(t, name):
+            calls.append(name)
+            return name != 'b'
+        dst = Registry()
+        import_type(dst, reg, 'a', None, filter_symbol)
+        self.assertEqual(calls, ['b', 'c', 'd'])
+        self.assertEqual([x[0] for x in dst.types], ['d', 'c', 'a'])
+        reg.types[('c', None)].required_types.add('e')
+        reg.clear_cache()
+        self.assertRaises(KeyError, import_type, Registry(), reg, 'a')
+        import_type(Registry(), reg, 'a', None, lambda t, name: name != 'e')
+
+    def test_import_type_deep(self):
+        n = sys.getrecursionlimit() + 100
+        reg = loads(glreg_bench.make_registry_xml(
+            types=n, enums=1, commands=1, params=0, features=1,
+            extensions=1, type_depth=n))
+        last = 'GLtype{0}'.format(n - 1)
+        for filter_symbol in (None, lambda t, name: True):
+            dst = Registry()
+            import_type(dst, reg, last, None, filter_symbol)
+            self.assertEqual([x[0] for x in dst.types],
+                             ['GLtype{0}'.format(i) for i in range(n)])
+
     def test_import_enum(self):
         import_enum(self.dst, self.src, 'GL_POINTS')
         enums = self.dst.enums
@@ -423,6 +1034,315 @@ class TestGroupAPIS(unittest.TestCase):
         self.assertEqual(len(dcmds), 0)
 
 
+class TestGenerateHeaders(unittest.TestCase):
+    targets = [(None, None, None), ('gl', 'core', 'gl'),
+               ('gles2', None, 'gles2')]
+
+    def expected(self):
+        out = []
+        for api, profile, support in self.targets:
+            f = io.StringIO() if sys.version_info > (3, 0) else io.BytesIO()
+            for x in group_apis(loads(_test_reg), api=api, profile=profile,
+                                support=support):
+                f.write('#ifndef {0}\n#define {0}\n{1}\n#endif\n\n'
+                        .format(x.name, x.text))
+            out.append(f.getvalue())
+        return out
+
+    def test_generate_headers(self):
+        headers = generate_headers(loads(_test_reg), self.targets, 2)
+        self.assertEqual(headers, self.expected())
+
+    def test_generate_headers_inline(self):
+        headers = generate_headers(loads(_test_reg), self.targets, 1)
+        self.assertEqual(headers, self.expected())
+
+
+_loader_test_main = r'''
+static void dummy(void) {}
+
+static glreg_proc get(const char *name)
+{
+    return strcmp(name, "glCommand3") ? (glreg_proc)dummy : NULL;
+}
+
+int main(void)
+{
+    struct glreg_dispatch d;
+    int i;
+    if (glreg_load(&d, get) != GLREG_NUM_COMMANDS - 1)
+        return 1;
+    for (i = 0; i < GLREG_NUM_COMMANDS; i++)
+        if (glreg_slot(glreg_names[i]) != i)
+            return 2;
+    if (glreg_slot("glCommand") != -1 || glreg_slot("") != -1)
+        return 3;
+    if (glreg_lookup(&d, "glCommand3") != NULL ||
+            glreg_lookup(&d, "glCommand4") != (glreg_proc)dummy)
+        return 4;
+    if (d.glCommand5 == NULL)
+        return 5;
+    return 0;
+}
+'''
+
+
+class TestWriteLoader(unittest.TestCase):
+    def test_perfect_hash(self):
+        names = ['glCommand{0}'.format(i) for i in range(500)]
+        seeds, slots = glreg._perfect_hash(names)
+        self.assertEqual(sorted(slots), sorted(names))
+        for x in names:
+            seed = seeds[glreg._hash_name(x, 0) % len(seeds)]
+            i = -seed - 1 if seed < 0 else glreg._hash_name(x, seed) % 500
+            self.assertEqual(slots[i], x)
+
+    def test_write_loader(self):
+        f = io.StringIO() if sys.version_info > (3, 0) else io.BytesIO()
+        write_loader(f, loads(_test_reg), 'gl')
+        out = f.getvalue()
+        self.assertIn('typedef void (APIENTRYP PFNGLBUFFERDATAPROC)(GLenum '
+                      'target, GLsizeiptr size, const void *data, GLenum '
+                      'usage);\n', out)
+        self.assertIn('struct gl_dispatch {\n    PFNGLBUFFERDATAPROC '
+                      'glBufferData;\n};', out)
+        self.assertIn('#define GL_NUM_COMMANDS 1\n', out)
+        self.assertRaises(ValueError, write_loader, f, Registry())
+
+    @unittest.skipIf(not getattr(shutil, 'which', lambda x: None)('cc'),
+                     'no C compiler')
+    def test_compile_loader(self):
+        reg = loads(glreg_bench.make_registry_xml(
+            types=20, enums=10, commands=300, features=2, extensions=2))
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            src = os.path.join(tmp_dir, 'loader.c')
+            with open(src, 'w') as f:
+                write_header(f, group_apis(reg))
+                write_loader(f, reg)
+                f.write(_loader_test_main)
+            exe = os.path.join(tmp_dir, 'loader')
+            subprocess.check_call(['cc', '-std=c99', '-Wall', '-Werror',
+                                   '-o', exe, src])
+            self.assertEqual(subprocess.call([exe]), 0)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+_enum_table_test_main = r'''
+#include <string.h>
+
+int main(void)
+{
+    if (strcmp(glreg_enum_name(0x0000), "GL_POINTS") ||
+            strcmp(glreg_enum_name(0x806F), "GL_TEXTURE_3D") ||
+            strcmp(glreg_enum_name(0x8070), "GL_TEXTURE_BINDING_3D") ||
+            strcmp(glreg_enum_name(0xFFFFFFFF), "GL_ALL_BITS") ||
+            glreg_enum_name(0x1234) != NULL)
+        return 1;
+    return 0;
+}
+'''
+
+
+class TestWriteEnumTable(unittest.TestCase):
+    def setUp(self):
+        self.reg = loads(_test_reg)
+        enums = list(self.reg.enums.values())
+        # Aliases which are not introduced by a feature are not preferred,
+        # even when they come first.
+        enums.insert(0, Enum('GL_TEXTURE_3D_EXT', '0x806F'))
+        enums.extend([Enum('GL_TEXTURE_BINDING_3D', '0x8070'),
+                      Enum('GL_ALL_BITS', '0xFFFFFFFFu'),
+                      Enum('GL_TIMEOUT_IGNORED', '0xFFFFFFFFFFFFFFFFull'),
+                      Enum('GL_INVALID_INDEX', '-1')])
+        self.reg.enums = collections.OrderedDict((x.name, x) for x in enums)
+
+    def test_get_enum_table(self):
+        self.assertEqual(get_enum_table(self.reg), [
+            (0, 'GL_POINTS'), (0x806F, 'GL_TEXTURE_3D'),
+            (0x8070, 'GL_TEXTURE_BINDING_3D'), (0xFFFFFFFF, 'GL_ALL_BITS')])
+
+    def test_write_enum_table(self):
+        f = io.StringIO() if sys.version_info > (3, 0) else io.BytesIO()
+        write_enum_table(f, self.reg)
+        self.assertIn('    {0x0000806FUL, "GL_TEXTURE_3D"},\n', f.getvalue())
+        self.assertRaises(ValueError, write_enum_table, f, Registry())
+
+    @unittest.skipIf(not getattr(shutil, 'which', lambda x: None)('cc'),
+                     'no C compiler')
+    def test_compile_enum_table(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            src = os.path.join(tmp_dir, 'enums.c')
+            with open(src, 'w') as f:
+                write_enum_table(f, self.reg)
+                f.write(_enum_table_test_main)
+            exe = os.path.join(tmp_dir, 'enums')
+            subprocess.check_call(['cc', '-std=c99', '-Wall', '-Werror',
+                                   '-o', exe, src])
+            self.assertEqual(subprocess.call([exe]), 0)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class TestDiff(unittest.TestCase):
+    def test_diff_same(self):
+        delta = diff(loads(_test_reg), loads(_test_reg))
+        self.assertIsInstance(delta, RegistryDiff)
+        self.assertFalse(delta)
+
+    def test_diff(self):
+        old = loads(_test_reg)
+        new = loads(_test_reg)
+        del new.enums['GL_POINTS']
+        new.enums['GL_LINES'] = Enum('GL_LINES', '0x0001')
+        new.types[('GLbyte', 'gles2')].template = 'typedef char {name};'
+        new.commands['glBufferData'].params[2].type = 'GLvoid'
+        new.features['GL_VERSION_3_2'].requires[0].enums.append('GL_LINES')
+        delta = diff(old, new)
+        self.assertTrue(delta)
+        self.assertEqual(delta.types.changed, [('GLbyte', 'gles2')])
+        self.assertEqual(delta.types.added, [])
+        self.assertEqual(delta.enums.added, ['GL_LINES'])
+        self.assertEqual(delta.enums.removed, ['GL_POINTS'])
+        self.assertEqual(delta.enums.changed, [])
+        self.assertEqual(delta.commands.changed, ['glBufferData'])
+        self.assertEqual(delta.features.changed, ['GL_VERSION_3_2'])
+        self.assertFalse(delta.extensions)
+
+
+class TestIterGroupAPIS(unittest.TestCase):
+    def test_iter_group_apis(self):
+        reg = loads(_test_reg)
+        it = iter_group_apis(reg, api='gl')
+        api = next(it)
+        self.assertIsInstance(api, Registry)
+        self.assertEqual(api.name, 'GL_VERSION_3_2')
+        self.assertEqual([x.name for x in it],
+                         ['GL_ARB_vertex_buffer_object'])
+        self.assertEqual([repr(x) for x in iter_group_apis(reg)],
+                         [repr(x) for x in group_apis(reg)])
+
+    def test_once_filter(self):
+        reg = loads(glreg_bench.make_registry_xml(
+            types=40, enums=20, commands=30, features=3, extensions=10,
+            type_depth=4))
+        output_symbols = set()
+
+        def filter_symbol(t, name):
+            if (t, name) in output_symbols:
+                return False
+            output_symbols.add((t, name))
+            return True
+        expected = []
+        for x in reg.features:
+            out = Registry(x)
+            import_feature(out, reg, x, filter_symbol=filter_symbol)
+            expected.append(repr(out))
+        self.assertEqual([repr(x) for x in iter_group_apis(
+            reg, extensions=[])], expected)
+
+    def test_write_header(self):
+        reg = loads(_test_reg)
+        f = io.StringIO() if sys.version_info > (3, 0) else io.BytesIO()
+        write_header(f, iter_group_apis(reg))
+        expected = ''.join('#ifndef {0}\n#define {0}\n{1}\n#endif\n\n'
+                           .format(x.name, x.text) for x in group_apis(reg))
+        self.assertEqual(f.getvalue(), expected)
+
+
+class TestSyntheticRegistry(unittest.TestCase):
+    def test_make_registry_xml(self):
+        sizes = dict(types=12, enums=30, commands=20, params=2, features=3,
+                     extensions=5, type_depth=4)
+        data = glreg_bench.make_registry_xml(**sizes)
+        self.assertEqual(data, glreg_bench.make_registry_xml(**sizes))
+        self.assertNotEqual(data,
+                            glreg_bench.make_registry_xml(seed=1, **sizes))
+        reg = loads(data)
+        self.assertEqual(len(reg.types), 12)
+        self.assertEqual(len(reg.enums), 30)
+        self.assertEqual(len(reg.commands), 20)
+        self.assertEqual(len(reg.features), 3)
+        self.assertEqual(len(reg.extensions), 5)
+        for x in reg.commands.values():
+            self.assertEqual(len(x.params), 2)
+        dst = Registry()
+        import_type(dst, reg, 'GLtype3')
+        self.assertEqual([x[0] for x in dst.types],
+                         ['GLtype0', 'GLtype1', 'GLtype2', 'GLtype3'])
+
+    def test_load_dispatch(self):
+        data = glreg_bench.make_registry_xml(
+            types=12, enums=30, commands=20, features=3, extensions=5)
+        root = xml.etree.ElementTree.fromstring(data)
+        self.assertEqual(repr(glreg_bench._load_sweeps(root, StringPool())),
+                         repr(glreg._load(root)))
+        r = glreg_bench.bench_load_dispatch(data, 1)
+        self.assertEqual(sorted(r), ['single_pass', 'speedup', 'sweeps'])
+
+    def test_scaled_sizes(self):
+        sizes = glreg_bench.scaled_sizes(10)
+        self.assertEqual(sizes['commands'],
+                         10 * glreg_bench.GL_XML_SIZES['commands'])
+        self.assertEqual(sizes['params'], glreg_bench.GL_XML_SIZES['params'])
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        self.previous = set_tracer(self.tracer)
+
+    def tearDown(self):
+        set_tracer(self.previous)
+
+    def test_phases(self):
+        reg = loads(_test_reg)
+        apis = group_apis(reg, api='gl', profile='core')
+        set_tracer(self.previous)
+        phases = [(x['name'], x['args'].get('name'), x['args'].get('symbols'))
+                  for x in self.tracer.events]
+        self.assertEqual(phases, [
+            ('parse', None, None), ('_load_types', None, None),
+            ('_load_enums', None, None), ('_load_commands', None, None),
+            ('_load_features', None, None), ('_load_extensions', None, None),
+            ('import_feature', 'GL_VERSION_3_2', 7),
+            ('import_extension', 'GL_ARB_vertex_buffer_object', 0)])
+        self.assertEqual(phases[6][2], sum(len(x) for x in (
+            apis[0].types, apis[0].enums, apis[0].commands)))
+        for x in self.tracer.events:
+            self.assertEqual(x['ph'], 'X')
+            self.assertGreaterEqual(x['dur'], 0)
+            self.assertIn('cpu_us', x['args'])
+        totals = self.tracer.get_phase_totals()
+        self.assertEqual(totals['parse'][0], 1)
+
+    def test_counters(self):
+        reg = loads(_test_reg)
+        import_command(Registry(), reg, 'glBufferData', None,
+                       lambda t, name: True)
+        self.assertEqual(self.tracer.counters['import_command'], 1)
+        self.assertEqual(self.tracer.counters['import_type'], 2)
+        self.assertEqual(self.tracer.counters['filter_symbol'], 3)
+
+    def test_chrome_trace(self):
+        loads(_test_reg)
+        self.tracer.count('import_type', 3)
+        f = io.StringIO() if sys.version_info > (3, 0) else io.BytesIO()
+        self.tracer.write_chrome_trace(f)
+        trace = json.loads(f.getvalue())
+        counters = [x for x in trace['traceEvents'] if x['ph'] == 'C']
+        self.assertEqual(counters[0]['args'], {'import_type': 3})
+        self.assertEqual(len(trace['traceEvents']),
+                         len(self.tracer.events) + 1)
+
+    def test_disabled(self):
+        set_tracer(None)
+        loads(_test_reg)
+        self.assertEqual(self.tracer.events, [])
+
+
 class TestMain(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -435,6 +1355,116 @@ class TestMain(unittest.TestCase):
 
     def test_main(self):
         glreg.main(['-o', self.fout.name, self.fin.name])
+        self.assertEqual(self.fout.read(),
+                         generate_headers(loads(_test_reg), [(None,) * 3],
+                                          1)[0])
+
+    def test_main_stdin(self):
+        stdin = sys.stdin
+        sys.stdin = io.TextIOWrapper(io.BytesIO(_test_reg.encode('utf-8')))
+        try:
+            glreg.main(['-o', self.fout.name, '-'])
+        finally:
+            sys.stdin = stdin
+        self.assertEqual(self.fout.read(),
+                         generate_headers(loads(_test_reg), [(None,) * 3],
+                                          1)[0])
+
+    def test_main_missing(self):
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            self.assertEqual(glreg.main(['-o', self.fout.name, os.path.join(
+                tempfile.gettempdir(), 'no', 'gl')]), 1)
+            self.assertIn('No such file', sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+    @unittest.skipIf(sys.version_info < (3, 2), 'No ResourceWarning')
+    def test_main_closes_files(self):
+        fold = tempfile.NamedTemporaryFile('w')
+        fold.write(_test_reg)
+        fold.flush()
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always', ResourceWarning)
+            glreg.main(['-o', self.fout.name, '--diff', fold.name,
+                        self.fin.name])
+            gc.collect()
+        self.assertEqual([str(x.message) for x in w
+                          if issubclass(x.category, ResourceWarning) and
+                          (fold.name in str(x.message) or
+                           self.fin.name in str(x.message))], [])
+
+    def test_main_cache_dir(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            for i in range(2):
+                self.assertEqual(glreg.main(['-o', self.fout.name,
+                                             '--cache-dir', cache_dir,
+                                             self.fin.name]), 0)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_main_diff(self):
+        fold = tempfile.NamedTemporaryFile('w')
+        fold.write(_test_reg.replace('GL_TEXTURE_3D', 'GL_TEXTURE_2D'))
+        fold.flush()
+        glreg.main(['-o', self.fout.name, '--diff', fold.name,
+                     self.fin.name])
+        self.assertEqual(self.fout.read().splitlines(),
+                         ['+ enum GL_TEXTURE_3D', '- enum GL_TEXTURE_2D',
+                          '~ feature GL_VERSION_3_2'])
+
+    def test_main_manifest(self):
+        out_dir = tempfile.mkdtemp()
+        try:
+            manifest = os.path.join(out_dir, 'manifest.json')
+            with open(manifest, 'w') as f:
+                f.write('[{"output": "gl.h"}, {"output": "glcore.h", '
+                        '"api": "gl", "profile": "core", "support": "gl"}]')
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter('always')
+                self.assertEqual(glreg.main(['--manifest', manifest, '-j',
+                                             '2', self.fin.name]), 0)
+                gc.collect()
+            self.assertEqual([str(x.message) for x in w
+                              if manifest in str(x.message)], [])
+            expected = generate_headers(loads(_test_reg), [
+                (None, None, None), ('gl', 'core', 'gl')], 1)
+            for name, header in zip(('gl.h', 'glcore.h'), expected):
+                with open(os.path.join(out_dir, name)) as f:
+                    self.assertEqual(f.read(), header)
+            with open(manifest, 'w') as f:
+                f.write('[{"api": "gl"}]')
+            self.assertEqual(glreg.main(['--manifest', manifest,
+                                         self.fin.name]), 1)
+        finally:
+            shutil.rmtree(out_dir)
+
+    def test_main_trace_out(self):
+        with tempfile.NamedTemporaryFile('r') as trace:
+            self.assertEqual(glreg.main(['-o', self.fout.name, '--trace-out',
+                                         trace.name, self.fin.name]), 0)
+            events = json.load(trace)['traceEvents']
+        names = [x['name'] for x in events]
+        self.assertEqual(names[:6], ['parse', '_load_types', '_load_enums',
+                                     '_load_commands', '_load_features',
+                                     '_load_extensions'])
+        self.assertTrue(set(['import_feature', 'write_header', 'import_type',
+                             'filter_symbol']) <= set(names))
+
+    def test_main_loader(self):
+        self.assertEqual(glreg.main(['-o', self.fout.name, '--loader',
+                                     '--api', 'gl', self.fin.name]), 0)
+        f = io.StringIO() if sys.version_info > (3, 0) else io.BytesIO()
+        write_loader(f, loads(_test_reg))
+        self.assertEqual(self.fout.read(), f.getvalue())
+
+    def test_main_enum_table(self):
+        self.assertEqual(glreg.main(['-o', self.fout.name, '--enum-table',
+                                     self.fin.name]), 0)
+        self.assertIn('"GL_TEXTURE_3D"', self.fout.read())
 
     def test_main_list_apis(self):
         glreg.main(['-o', self.fout.name, '--list-apis', self.fin.name])
@@ -1,5 +1,10 @@
+import sys
 from setuptools import setup
 
+# glreg_async uses async/await syntax
+py_modules = ['glreg']
+if sys.version_info >= (3, 5):
+    py_modules.append('glreg_async')
 
 setup(name='glreg',
       version='0.9.0a3',
@@ -23,7 +28,7 @@ setup(name='glreg',
           'Topic :: Software Development :: Libraries :: Python Modules',
       ],
       keywords='opengl',
-      py_modules=['glreg'],
+      py_modules=py_modules,
       entry_points={
           'console_scripts': [
               'glreg=glreg:main'